@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for machine_driver_scripts/engine.py on synthetic environments.
+
+    python benchmarks/engine_bench.py --output before.json
+    python benchmarks/engine_bench.py --output after.json --compare before.json
+    python benchmarks/engine_bench.py --quick
+
+Environments are generated in a temporary directory and vary one dimension
+at a time from a base configuration: map key count, template size, !func()
+call density, additional file count and value size. Everything runs
+in-process with plain Python utils, no Slurm or cluster tools are needed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from machine_driver_scripts.engine import Engine, environment_pool, calls_ordered_utils
+from machine_driver_scripts.map_parser import parse_map_value
+from machine_driver_scripts.module_cache import utils_module_cache
+from machine_driver_scripts.preview_cache import preview_cache
+from machine_driver_scripts.render_plan import text_cache, json_cache, compile_template
+
+BASE = {"keys": 100, "template_lines": 500, "call_density": 0.5, "additional_files": 5, "value_size": 64}
+
+VARIATIONS = {
+    "keys": [10, 100, 1000],
+    "template_lines": [50, 500, 5000],
+    "call_density": [0.0, 0.5, 1.0],
+    "additional_files": [0, 5, 50],
+    "value_size": [16, 256, 4096],
+}
+
+QUICK_VARIATIONS = {"keys": [10, 100], "call_density": [0.0, 1.0]}
+
+UTILS = '''
+def pad(value, size):
+    return (str(value) * int(size))[:int(size)]
+
+def opts(a, b):
+    return "--a=" + a + " --b=" + b
+
+def lines(value, count):
+    return "\\n".join(value for _ in range(int(count)))
+'''
+
+
+def make_environment(root, name, keys, template_lines, call_density, additional_files, value_size, seed=0):
+    """Write a synthetic environment to root/name and return the form params it expects."""
+    rng = random.Random(seed)
+    env_path = os.path.join(root, name)
+    os.makedirs(os.path.join(env_path, "additional_files"))
+
+    params = {"name": "bench", "location": os.path.join(root, "runs", name)}
+    mapping = {}
+    for i in range(keys):
+        field = f"field{i % 20}"
+        params[field] = "x" * max(1, value_size // 4)
+        if rng.random() < call_density:
+            kind = rng.randrange(3)
+            if kind == 0:
+                mapping[f"KEY{i}"] = f"!pad(${field}, {value_size})"
+            elif kind == 1:
+                mapping[f"KEY{i}"] = f"!opts(${field}, 'v{i}')"
+            else:
+                mapping[f"KEY{i}"] = f"!lines(${field}, 3)"
+        else:
+            mapping[f"KEY{i}"] = f"--option{i}=${field} -n ${field}"
+
+    key_names = list(mapping)
+
+    def body(count):
+        out = []
+        for i in range(count):
+            if i % 4 == 0:
+                out.append(f"    [{rng.choice(key_names)}] # line {i}")
+            else:
+                out.append(f"echo 'static line {i}'")
+        return "\n".join(out) + "\n"
+
+    with open(os.path.join(env_path, "map.json"), "w") as f:
+        json.dump(mapping, f)
+    with open(os.path.join(env_path, "utils.py"), "w") as f:
+        f.write(UTILS)
+    with open(os.path.join(env_path, "schema.json"), "w") as f:
+        json.dump({"name": {"type": "text", "label": "Name"}}, f)
+    with open(os.path.join(env_path, "driver.sh"), "w") as f:
+        f.write("#!/bin/bash\n" + body(max(10, template_lines // 10)))
+    with open(os.path.join(env_path, "template.txt"), "w") as f:
+        f.write("#!/bin/bash\n" + body(template_lines))
+
+    listed = []
+    for i in range(additional_files):
+        file_name = f"input{i}.txt"
+        with open(os.path.join(env_path, "additional_files", file_name), "w") as f:
+            f.write(body(max(10, template_lines // 10)))
+        listed.append({"file_name": file_name, "preview_name": file_name, "preview_order": i})
+    with open(os.path.join(env_path, "additional_files.json"), "w") as f:
+        json.dump(listed, f)
+
+    return params
+
+
+def clear_caches():
+    environment_pool.clear()
+    text_cache.clear()
+    json_cache.clear()
+    parse_map_value.cache_clear()
+    compile_template.cache_clear()
+    utils_module_cache.clear()
+    preview_cache.clear()
+    calls_ordered_utils.cache_clear()
+
+
+def measure(fn, min_time):
+    """Run fn until min_time seconds have passed; returns ms per call, calls per second and memory figures."""
+    fn()  # Warm up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0)
+
+    return {
+        "ms": elapsed / calls * 1e3,
+        "per_s": calls / elapsed,
+        "peak_kb": peak / 1024,
+        "blocks": allocated
+    }
+
+
+def bench_environment(root, name, config, min_time):
+    params = make_environment(root, name, **config)
+
+    engine = Engine()
+    engine.set_environment(name, root)
+    source_map = dict(engine.map)
+    with contextlib.redirect_stdout(io.StringIO()):
+        evaluated = engine.evaluate_map(dict(source_map), params)
+    template = text_cache.get(os.path.join(root, name, "template.txt"))
+
+    def evaluate_map():
+        engine.evaluate_map(dict(source_map), params)
+
+    def replace_placeholders():
+        engine.replace_placeholders(template, evaluated, params)
+
+    def preview_script():
+        preview_engine = Engine()
+        preview_engine.set_environment(name, root)
+        preview_engine.preview_script(dict(params))
+
+    def preview_script_cold():
+        clear_caches()
+        preview_script()
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for label, fn in (("evaluate_map", evaluate_map),
+                          ("replace_placeholders", replace_placeholders),
+                          ("preview_script", preview_script),
+                          ("preview_script_cold", preview_script_cold)):
+            results[label] = measure(fn, min_time)
+    return results
+
+
+def scenarios(variations):
+    seen = set()
+    for dimension, values in variations.items():
+        for value in values:
+            config = dict(BASE, **{dimension: value})
+            key = tuple(sorted(config.items()))
+            if key not in seen:
+                seen.add(key)
+                yield config
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {json.dumps(entry["config"], sort_keys=True): entry for entry in json.load(f)["results"]}
+    print(f"{'config':<72} {'metric':<22} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for entry in results:
+        previous = baseline.get(json.dumps(entry["config"], sort_keys=True))
+        if previous is None:
+            continue
+        config = " ".join(f"{k}={v}" for k, v in entry["config"].items())
+        for metric, values in entry["metrics"].items():
+            if metric not in previous["metrics"]:
+                continue
+            before = previous["metrics"][metric]["ms"]
+            after = values["ms"]
+            print(f"{config:<72} {metric:<22} {before:>10.3f} {after:>10.3f} {before / after:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine microbenchmarks on synthetic environments")
+    parser.add_argument("--quick", action="store_true", help="Fewer scenarios and shorter runs")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to run each measurement")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated environments")
+    args = parser.parse_args()
+
+    variations = QUICK_VARIATIONS if args.quick else VARIATIONS
+    min_time = min(args.min_time, 0.1) if args.quick else args.min_time
+
+    root = tempfile.mkdtemp(prefix="drona_engine_bench_")
+    results = []
+    try:
+        for i, config in enumerate(scenarios(variations)):
+            metrics = bench_environment(root, f"env{i}", config, min_time)
+            results.append({"config": config, "metrics": metrics})
+            summary = ", ".join(f"{metric} {values['ms']:.3f} ms" for metric, values in metrics.items())
+            print(" ".join(f"{k}={v}" for k, v in config.items()) + ": " + summary, file=sys.stderr)
+    finally:
+        if args.keep:
+            print("environments kept in", root, file=sys.stderr)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "min_time": min_time
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
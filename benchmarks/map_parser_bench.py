@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Property checks and a microbenchmark for machine_driver_scripts/map_parser.py.
+
+    python benchmarks/map_parser_bench.py --check --fuzz 5000
+    python benchmarks/map_parser_bench.py --iterations 2000
+
+The legacy scanner below is the character-by-character implementation that
+process_function used before the parser; it is kept here as the reference
+for differential checks and as the benchmark baseline.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from machine_driver_scripts.map_parser import Parser, parse_map_value, tokenize, evaluate, FunctionNotFound
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_expressions.json")
+VAR_TAG_RE = re.compile(r'<var>(.*?)\n*</var>', re.DOTALL)
+
+
+def legacy_find_function_calls(text):
+    calls = []
+    i = 0
+    while i < len(text):
+        if text[i:i+5] == '<var>':
+            i += 5
+            while i < len(text) - 5 and text[i:i+6] != '</var>':
+                i += 1
+            if i < len(text) - 5:
+                i += 6
+            continue
+        if text[i] == '!':
+            func_match = re.match(r'!(\w+)\(', text[i:])
+            if func_match:
+                start = i
+                func_name = func_match.group(1)
+                i += len(func_match.group(0))
+                params_start = i
+                while i < len(text):
+                    if text[i] == ')':
+                        calls.append((start, i + 1, func_name, text[params_start:i]))
+                        i += 1
+                        break
+                    elif text[i] in ['"', "'"]:
+                        quote = text[i]
+                        i += 1
+                        while i < len(text):
+                            if text[i] == '\\':
+                                i += 2
+                                if i > len(text):
+                                    break
+                            elif text[i] == quote:
+                                i += 1
+                                break
+                            else:
+                                i += 1
+                    elif text[i:i+5] == '<var>':
+                        i += 5
+                        while i < len(text) - 5 and text[i:i+6] != '</var>':
+                            i += 1
+                        if i < len(text) - 5:
+                            i += 6
+                    else:
+                        i += 1
+            else:
+                i += 1
+        else:
+            i += 1
+    return calls
+
+def legacy_parse_parameters(params_str):
+    if not params_str.strip():
+        return []
+    params = []
+    current_param = ""
+    i = 0
+    while i < len(params_str):
+        if params_str[i] == ',':
+            params.append(current_param.strip())
+            current_param = ""
+        elif params_str[i] in ['"', "'"]:
+            quote = params_str[i]
+            current_param += quote
+            i += 1
+            while i < len(params_str) and params_str[i] != quote:
+                current_param += params_str[i]
+                i += 1
+            if i < len(params_str):
+                current_param += params_str[i]
+        elif params_str[i:i+5] == '<var>':
+            start_tag = i
+            i += 5
+            while i < len(params_str) - 5 and params_str[i:i+6] != '</var>':
+                i += 1
+            i += 6
+            current_param += params_str[start_tag:i]
+            continue
+        else:
+            current_param += params_str[i]
+        i += 1
+    if current_param.strip():
+        params.append(current_param.strip())
+    return params
+
+def legacy_evaluate(value, params, functions):
+    """The old evaluate_map pipeline for one value: regex substitution, scanner, tag removal."""
+    def replace_flag(match):
+        if match.group(2) in params:
+            return f"-{match.group(1)} <var>{params[match.group(2)]}</var>"
+        return match.group(0)
+
+    def replace_no_flag(match):
+        if match.group(1) in params:
+            return f"<var>{params[match.group(1)]}</var>"
+        return match.group(0)
+
+    value = re.sub(r'-(.) \$(\w+)', replace_flag, value)
+    value = re.sub(r'\$(\w+)', replace_no_flag, value)
+    for start, end, name, params_str in reversed(legacy_find_function_calls(value)):
+        args = []
+        for var in legacy_parse_parameters(params_str):
+            var = var.strip()
+            if (var.startswith('"') and var.endswith('"')) or (var.startswith("'") and var.endswith("'")):
+                var = var[1:-1]
+            if var.startswith('<var>') and var.endswith('</var>'):
+                var = var[5:-6]
+            args.append(var)
+        if name not in functions:
+            return f"Function {name} not found in local or global utils."
+        value = value[:start] + str(functions[name](*args)) + value[end:]
+    return VAR_TAG_RE.sub(r'\1', value)
+
+def new_evaluate(value, params, functions):
+    try:
+        rendered = evaluate(parse_map_value(value), params, functions.get)
+    except FunctionNotFound as e:
+        return f"Function {e.name} not found in local or global utils."
+    return VAR_TAG_RE.sub(r'\1', rendered)
+
+
+FUNCTIONS = {name: (lambda name: lambda *args: f"{name}<{'|'.join(args)}>")(name)
+             for name in ("f", "g", "join", "wrap", "called", "first", "second", "multi_line",
+                          "retrieve_batch_opts", "get_queue_name", "quote", "count", "outer",
+                          "inner", "not_called")}
+PARAMS = {"x": "X1", "y": "Y 2", "z": "z3", "cores": "8", "time": "12", "memory": "64G",
+          "partition": "gpu", "account": "acct", "version": "R2023a", "gpu_type": "a100", "gpus": "2"}
+
+def random_simple_value(rnd):
+    """Values in the subset both implementations agree on: no nesting, escapes or stray quotes."""
+    def arg():
+        kind = rnd.randrange(5)
+        if kind == 0:
+            return "$" + rnd.choice(list(PARAMS) + ["nope"])
+        if kind == 1:
+            return '"' + rnd.choice(["a,b", "plain", "sp ace", "$x"]) + '"'
+        if kind == 2:
+            return "<var>" + rnd.choice(["x)y", "a,b", "$y"]) + "</var>"
+        if kind == 3:
+            return rnd.choice(["lit", " padded ", "1"])
+        return ""
+    parts = []
+    for _ in range(rnd.randint(0, 6)):
+        kind = rnd.randrange(6)
+        if kind == 0:
+            parts.append(rnd.choice(["text ", "--opt=", "\n", "  ", "a-b", "#SBATCH "]))
+        elif kind == 1:
+            parts.append("$" + rnd.choice(list(PARAMS) + ["nope"]))
+        elif kind == 2:
+            parts.append("-" + rnd.choice("npt") + " $" + rnd.choice(list(PARAMS)))
+        elif kind == 3:
+            args = [arg() for _ in range(rnd.randint(0, 3))]
+            while args and args[-1] == "":
+                args.pop()
+            parts.append("!" + rnd.choice(["f", "g", "join"]) + "(" + ", ".join(args) + ")")
+        elif kind == 4:
+            parts.append("<var>" + rnd.choice(["!f(1)", "$x", "plain"]) + "</var>")
+        else:
+            parts.append(rnd.choice(["(", ")", ",", "! "]))
+    return "".join(parts)
+
+def random_any_value(rnd):
+    alphabet = ["$x", "-n ", "!f(", "!g(", "(", ")", ",", '"', "'", "\\", "<var>", "</var>", "a", " ", "\n", "$"]
+    return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 30)))
+
+
+def check(corpus, fuzz, seed):
+    failures = 0
+    rnd = random.Random(seed)
+
+    for value in corpus + [random_any_value(rnd) for _ in range(fuzz)]:
+        tokens = tokenize(value)
+        if "".join(tok.text for tok in tokens) != value:
+            print("tokenize round trip failed:", repr(value))
+            failures += 1
+        try:
+            new_evaluate(value, PARAMS, FUNCTIONS)
+        except Exception as e:
+            print("evaluation raised:", repr(value), e)
+            failures += 1
+
+    for value in [random_simple_value(rnd) for _ in range(fuzz)]:
+        expected = legacy_evaluate(value, PARAMS, FUNCTIONS)
+        actual = new_evaluate(value, PARAMS, FUNCTIONS)
+        if expected != actual:
+            print("differs from legacy:", repr(value))
+            print("   legacy:", repr(expected))
+            print("   parser:", repr(actual))
+            failures += 1
+
+    print(f"checked {len(corpus) + 2 * fuzz} values, {failures} failures")
+    return failures
+
+
+def bench(corpus, iterations):
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for value in corpus:
+                fn(value)
+        return (time.perf_counter() - start) / (iterations * len(corpus)) * 1e6
+
+    results = {
+        "legacy_scan_us": timed(lambda v: [legacy_parse_parameters(c[3]) for c in legacy_find_function_calls(v)]),
+        "legacy_evaluate_us": timed(lambda v: legacy_evaluate(v, PARAMS, FUNCTIONS)),
+        "parse_uncached_us": timed(lambda v: Parser(v).parse()),
+        "parse_cached_us": timed(parse_map_value),
+        "evaluate_cached_us": timed(lambda v: new_evaluate(v, PARAMS, FUNCTIONS)),
+    }
+    print(json.dumps(results, indent=2))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="map_parser checks and microbenchmark")
+    parser.add_argument("--check", action="store_true", help="Run property and differential checks")
+    parser.add_argument("--fuzz", type=int, default=2000, help="Random values per check")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--iterations", type=int, default=500, help="Benchmark passes over the corpus")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH) as f:
+        corpus = json.load(f)
+
+    if args.check:
+        sys.exit(1 if check(corpus, args.fuzz, args.seed) else 0)
+    bench(corpus, args.iterations)
+
+if __name__ == "__main__":
+    main()
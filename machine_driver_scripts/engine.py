@@ -2,256 +2,150 @@ import json
 import re
 import argparse
 import ast
+import contextvars
 import shutil
 import os
 import sys
+import sysconfig
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from machine_driver_scripts.utils import *
-import importlib.util
-
-def load_module_with_imports(module_name, file_path):
-    if not os.path.exists(file_path):
-        return None
-    module_dir = os.path.dirname(file_path)
-    packages_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'packages')
-    
-    utils_scripts_dir = os.path.join(module_dir, 'utils_scripts')
-    
-    paths_added = []
-    sys.path.insert(0, module_dir)
-    paths_added.append(module_dir)
-    
-    if os.path.exists(packages_dir) and packages_dir not in sys.path:
-        sys.path.insert(0, packages_dir)
-        paths_added.append(packages_dir)
-    
-    # Add utils_scripts if it exists
-    if os.path.exists(utils_scripts_dir) and utils_scripts_dir not in sys.path:
-        sys.path.insert(0, utils_scripts_dir)
-        paths_added.append(utils_scripts_dir)
-    
-    module = None
+from machine_driver_scripts.render_plan import text_cache, json_cache, compile_template, render_file, render_head
+from machine_driver_scripts.map_parser import parse_map_value, evaluate, FunctionNotFound
+from machine_driver_scripts.module_cache import utils_module_cache
+from machine_driver_scripts.preview_cache import preview_cache
+from machine_driver_scripts.environment_pool import EnvironmentPool, EnvironmentSnapshot, ENVIRONMENT_FILES
+from machine_driver_scripts.timings import Timings, timing_stats
+from drona_utils.context import PreviewContext
+
+VAR_TAG_RE = re.compile(r'<var>(.*?)\n*</var>', re.DOTALL)
+
+# Upper bound on threads evaluating map keys whose !func() calls are independent
+MAP_WORKERS = int(os.getenv("DRONA_MAP_WORKERS", "4"))
+
+# Additional files larger than this are streamed from disk instead of held in memory
+STREAM_THRESHOLD = int(os.getenv("DRONA_STREAM_THRESHOLD", str(1024 * 1024)))
+
+# How much of a streamed file the preview shows
+PREVIEW_HEAD_BYTES = int(os.getenv("DRONA_PREVIEW_HEAD_BYTES", str(64 * 1024)))
+
+# drona_utils calls whose effect depends on the order map keys are evaluated in
+ORDERED_UTILS = {
+    "drona_add_mapping", "drona_add_message", "drona_add_error",
+    "drona_add_warning", "drona_add_note", "drona_add_additional_file",
+    "drona_preview_env"
+}
+
+# Code from the standard library and installed packages never calls drona_utils
+# helpers other than by their own names, so calls_ordered_utils does not follow it
+LIBRARY_DIRS = tuple({sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")})
+
+def job_file_name(name):
+    """Name of the job script written for a job called name."""
+    if name == 'unnamed':
+        return "template.txt"
+    return f"{name.replace('-', '_').replace(' ', '_')}.job"
+
+def is_binary_file(path, sample_size=8192):
+    """A file is treated as binary when its first bytes contain a NUL byte."""
+    with open(path, 'rb') as f:
+        return b'\0' in f.read(sample_size)
+
+def resolve_function(function_name, global_module, local_module):
+    # Get the function, prioritizing the local module
+    for module in (local_module, global_module):
+        if module and callable(getattr(module, function_name, None)):
+            return getattr(module, function_name)
+    return None
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_names"):
+            names |= _code_names(const)
+    return names
+
+def _referenced(namespace, names):
+    """Objects that names can refer to: globals of namespace and attributes of the modules among them."""
+    for name in names:
+        value = namespace.get(name)
+        if value is None:
+            continue
+        yield value
+        if isinstance(value, types.ModuleType):
+            for attribute in names:
+                member = getattr(value, attribute, None)
+                if member is not None:
+                    yield member
+
+@lru_cache(maxsize=1024)
+def calls_ordered_utils(function):
+    """
+    True if function, or a helper it references from any module outside the
+    standard library and installed packages, calls one of the ORDERED_UTILS
+    (drona_add_mapping, drona_add_warning, ...), under its own name or an alias.
+    Helpers are found through globals, module attributes and class methods.
+    """
+    pending = [function]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        current = getattr(current, "__func__", current)
+        code = getattr(current, "__code__", None)
+        if code is None or code in seen or code.co_filename.startswith(LIBRARY_DIRS):
+            continue
+        seen.add(code)
+        names = _code_names(code)
+        if names & ORDERED_UTILS:
+            return True
+        for helper in _referenced(current.__globals__, names):
+            if getattr(helper, "__name__", None) in ORDERED_UTILS:
+                return True
+            if isinstance(helper, type):
+                pending.extend(vars(helper).values())
+            elif hasattr(helper, "__code__") or hasattr(helper, "__func__"):
+                pending.append(helper)
+    return False
+
+def process_function(expression, params, environment, env_dir, modules=None, timings=None):
+    """
+    Evaluate a parsed map value, running its !func() calls from the utils modules.
+    modules is an optional (global_module, local_module) pair already fetched by the caller.
+    Every function call is recorded in timings when one is given.
+    """
+    if not expression.has_calls:
+        return evaluate(expression, params, None)
+
+    # Modules stay loaded between calls and are only re-executed after utils.py
+    # or utils_scripts/ change on disk
     try:
-        spec = importlib.util.spec_from_file_location(module_name, file_path)
-        if spec and spec.loader:
-            # Remove any existing module to avoid caching issues
-            if module_name in sys.modules:
-                del sys.modules[module_name]
-
-            # Also clear any imported submodules that might be cached
-            modules_to_clear = [name for name in sys.modules.keys() if name.startswith(f"{module_name}.")]
-            for mod_name in modules_to_clear:
-                del sys.modules[mod_name]
-
-            # Clear environment-specific utils_scripts modules
-            if 'utils_scripts' in sys.modules:
-                del sys.modules['utils_scripts']
-
-            utils_scripts_modules = [name for name in sys.modules.keys() if 'utils_scripts' in name]
-            for mod_name in utils_scripts_modules:
-                del sys.modules[mod_name]
-                
-            module = importlib.util.module_from_spec(spec)
-
-            # Add the module to sys.modules before execution. This is crucial
-            # for relative imports (e.g., from . import other_file) to work.
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
+        global_module, local_module = modules or utils_module_cache.get(environment, env_dir)
     except Exception as e:
-        print("Import error:", e)
-    
-
-    return module
+        print("----------------------\nError:", e)
+        return "[Error]"
 
-def cleanup_added_paths(env_dir, environment):
-    module_dir = os.path.join(env_dir, environment)
-    packages_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'packages')
-    utils_scripts_dir = os.path.join(module_dir, 'utils_scripts')
-    
-    paths_to_remove = [module_dir, packages_dir, utils_scripts_dir]
-    for path in paths_to_remove:
-        while path in sys.path:
-            sys.path.remove(path)
-
-def process_function(value, environment, env_dir):
-
-    def find_function_calls(text):
-        calls = []
-        i = 0
-        while i < len(text):
-            # Skip var tags
-            if text[i:i+5] == '<var>':
-                i += 5
-                while i < len(text) - 5 and text[i:i+6] != '</var>':
-                    i += 1
-                if i < len(text) - 5:
-                    i += 6  # Skip closing tag
-                continue
-            # Check for function call
-            if text[i] == '!':
-                # Try to match function pattern starting from current position
-                func_match = re.match(r'!(\w+)\(', text[i:])
-                if func_match:
-                    start = i
-                    func_name = func_match.group(1)
-                    i += len(func_match.group(0))  # Move past the opening parenthesis
-                    params_start = i
-                    # Find the matching closing parenthesis
-                    while i < len(text):
-                        if text[i] == ')':
-                            # Found our closing parenthesis
-                            params = text[params_start:i]
-                            calls.append((start, i + 1, func_name, params))
-                            i += 1  # Move past the closing parenthesis
-                            break
-                        elif text[i] in ['"', "'"]:
-                            # Skip quoted string with proper escape handling
-                            quote = text[i]
-                            i += 1
-                            while i < len(text):
-                                if text[i] == '\\':
-                                    # Skip escaped character
-                                    i += 2  # Skip both backslash and escaped char
-                                    if i > len(text):  # Bounds check
-                                        break
-                                elif text[i] == quote:
-                                    # Found unescaped closing quote
-                                    i += 1  # Skip closing quote
-                                    break
-                                else:
-                                    i += 1
-                        elif text[i:i+5] == '<var>':
-                            # Skip var tag
-                            i += 5
-                            while i < len(text) - 5 and text[i:i+6] != '</var>':
-                                i += 1
-                            if i < len(text) - 5:
-                                i += 6  # Skip closing tag
-                        else:
-                            i += 1
-                else:
-                    i += 1
-            else:
-                i += 1
-        return calls
-        
-    # Load modules using the new helper function
-    try:
-        global_utils_path = os.path.join("machine_driver_scripts", "utils.py")
-        global_module = load_module_with_imports("global_utils", global_utils_path)
-
-        local_module = None
-        local_function_path = os.path.join(env_dir, environment, "utils.py")
-        if os.path.exists(local_function_path):
-            # Create a unique module name to avoid conflicts between environments
-            local_module_name = f"local_utils_{environment}"
-            local_module = load_module_with_imports(local_module_name, local_function_path)
-            
-            # Make global functions available to the local module
-            if global_module and local_module:
-                for func_name in dir(global_module):
-                    if callable(getattr(global_module, func_name)):
-                        setattr(local_module, func_name, getattr(global_module, func_name))
-
-        # Process function calls (in reverse order to maintain string positions)
-        calls = find_function_calls(value)
-        for start, end, function_name, params_str in reversed(calls):
-            # Parse parameters, handling quoted strings and tagged variables
-            def parse_parameters(params_str):
-                if not params_str.strip():
-                    return []
-                params = []
-                current_param = ""
-                i = 0
-                while i < len(params_str):
-                    if params_str[i] == ',':
-                        params.append(current_param.strip())
-                        current_param = ""
-                    elif params_str[i] in ['"', "'"]:
-                        # Copy quoted string as-is
-                        quote = params_str[i]
-                        current_param += quote
-                        i += 1
-                        while i < len(params_str) and params_str[i] != quote:
-                            current_param += params_str[i]
-                            i += 1
-                        if i < len(params_str):
-                            current_param += params_str[i]  # Add closing quote
-                    elif params_str[i:i+5] == '<var>':
-                        # Copy var tag as-is
-                        start_tag = i
-                        i += 5
-                        while i < len(params_str) - 5 and params_str[i:i+6] != '</var>':
-                            i += 1
-                        i += 6  # Include closing tag
-                        current_param += params_str[start_tag:i]
-                        continue  # Skip the i += 1 at the end
-                    else:
-                        current_param += params_str[i]
-                    i += 1
-                if current_param.strip():
-                    params.append(current_param.strip())
-                return params
-            variables = parse_parameters(params_str) if params_str else []
-            # Remove quotes from string parameters and unwrap tagged variables
-            processed_variables = []
-            for var in variables:
-                var = var.strip()
-                # Remove outer quotes if present
-                if (var.startswith('"') and var.endswith('"')) or (var.startswith("'") and var.endswith("'")):
-                    var = var[1:-1]
-                # Remove variable tags
-                if var.startswith('<var>') and var.endswith('</var>'):
-                    var = var[5:-6]
-                processed_variables.append(var)
-            
-            # Get the function, prioritizing the local module
-            dynamic_function = None
-            if local_module and hasattr(local_module, function_name) and callable(getattr(local_module, function_name)):
-                dynamic_function = getattr(local_module, function_name)
-            elif global_module and hasattr(global_module, function_name) and callable(getattr(global_module, function_name)):
-                dynamic_function = getattr(global_module, function_name)
-            else:
-                return f"Function {function_name} not found in local or global utils."
+    def resolve(function_name):
+        function = resolve_function(function_name, global_module, local_module)
+        if function is not None and timings is not None:
+            return timings.wrap(function_name, function)
+        return function
 
-            # Execute the function
-            try:
-                result = dynamic_function(*processed_variables)
-            except Exception as e:
-                result = f"Error: {e}"
-            if result is None:
-                result = ""
-            print(result)
-            # Replace the function call with the result
-            value = value[:start] + str(result) + value[end:]
-        cleanup_added_paths(env_dir, environment)
-    except Exception as e:
-       print("----------------------\nError:", e)
-       cleanup_added_paths(env_dir, environment)
-       return "[Error]"
-
-
-            
-
-    return value
-
-
-
-def replace_flag(match, params):
-    flag = match.group(1)
-    param_name = match.group(2)
-    if param_name in params:
-        return f"-{flag} <var>{params[param_name]}</var>"
-    return match.group(0)
+    with utils_module_cache.activate(os.path.abspath(os.path.join(env_dir, environment))):
+        try:
+            return evaluate(expression, params, resolve)
+        except FunctionNotFound as e:
+            return f"Function {e.name} not found in local or global utils."
+        except Exception as e:
+            print("----------------------\nError:", e)
+            return "[Error]"
 
-def replace_no_flag(match, params):
-    param_name = match.group(1)
-    if param_name in params:
-        return f"<var>{params[param_name]}</var>"
-    return match.group(0)
 
 
 class Engine():
-    def __init__(self):
+    def __init__(self, map_workers=None):
+        self.map_workers = MAP_WORKERS if map_workers is None else map_workers
         self.environment = None
         self.env_dir = None
         self.schema = None
@@ -261,56 +155,157 @@ class Engine():
         self.drona_job_name = None
         self.drona_job_location = None
         self.additional_files=None
+        self.streamed_files = {}
+        self.evaluated_map = None
+        self.map_inputs = {}
+        self.recomputed_keys = []
+        self.context = PreviewContext()
+        self.timings = Timings()
     
     def set_schema(self, schema_path):
-        with open(schema_path) as json_file:
-            self.schema = json.load(json_file)
+        # Shared with other engines through json_cache, treat as read-only
+        self.schema = json_cache.get(schema_path)
+
+    def evaluate_value(self, expression, params, modules=None):
+        # Replace $params with form values and run !func() calls on the cached AST
+        value = process_function(expression, params, self.environment, self.env_dir, modules, self.timings)
 
-    def evaluate_map(self, map, params):
+        # Remove variable tags
+        return VAR_TAG_RE.sub(r'\1', value)
+
+    def evaluate_key(self, key, expression, params, modules=None):
+        """evaluate_value for one map key, recording its wall time in self.timings."""
+        start = time.perf_counter()
+        value = self.evaluate_value(expression, params, modules)
+        self.timings.record_key(key, time.perf_counter() - start, len(value), cached=False)
+        return value
+
+    def is_ordered(self, expression, modules):
+        """
+        Whether a map value must be evaluated in map order on the calling thread:
+        its functions report messages, mappings or files, or cannot be resolved.
+        """
+        global_module, local_module = modules
+        for function_name in expression.calls:
+            function = resolve_function(function_name, global_module, local_module)
+            if function is None or calls_ordered_utils(function):
+                return True
+        return False
+
+    def key_inputs(self, expression, params, modules):
+        """Everything a map value's result depends on: its source, the utils modules and the params it references."""
+        referenced = tuple((name, name in params, params.get(name)) for name in sorted(expression.params))
+        return (expression.source, modules if expression.has_calls else None, referenced)
+
+    def evaluate_map(self, map, params, previous=None):
+        """
+        Evaluate every map value against params, in place.
+
+        Values without !func() calls are rendered directly. Values whose
+        functions are independent run on a bounded thread pool while values
+        that use drona_add_* utilities run one after another in map order, so
+        messages and dynamic mappings come out as with sequential evaluation.
+        Results keep the map's key order.
+
+        previous holds the map_inputs of an earlier evaluation. Keys whose
+        inputs are unchanged reuse that value instead of being evaluated
+        again, except keys that use drona_add_* utilities. Afterwards
+        map_inputs describes this evaluation and recomputed_keys lists the
+        keys that were evaluated.
+        """
         print(map)
         print("---------")
-        for key, value in map.items():
-            # 2. Replace the params name with the actual values in form fields
-            # Keys with flag
-        
-            pattern_flag = r'-(.) \$(\w+)'
-            value = re.sub(pattern_flag, lambda match: replace_flag(match, params), value)
+        expressions = {key: parse_map_value(value) for key, value in map.items()}
 
+        modules = None
+        ordered = set()
+        if any(expression.has_calls for expression in expressions.values()):
+            try:
+                modules = utils_module_cache.get(self.environment, self.env_dir)
+                ordered = {key for key, expression in expressions.items()
+                           if expression.has_calls and self.is_ordered(expression, modules)}
+            except Exception as e:
+                print("Falling back to sequential map evaluation:", e)
+                ordered = {key for key, expression in expressions.items() if expression.has_calls}
+
+        inputs = {key: self.key_inputs(expression, params, modules) for key, expression in expressions.items()}
+        pending = []
+        for key in expressions:
+            cached = previous.get(key) if previous and key not in ordered else None
+            if cached is not None and cached[0] == inputs[key]:
+                map[key] = cached[1]
+                self.timings.record_key(key, 0.0, len(cached[1]), cached=True)
+            else:
+                pending.append(key)
+
+        concurrent_keys = []
+        if self.map_workers > 1:
+            concurrent_keys = [key for key in pending
+                               if expressions[key].has_calls and key not in ordered]
+
+        futures = {}
+        executor = None
+        if len(concurrent_keys) > 1:
+            executor = ThreadPoolExecutor(max_workers=min(self.map_workers, len(concurrent_keys)))
+            for key in concurrent_keys:
+                # Each task runs in a copy of the caller's context so drona_add_* reach its PreviewContext
+                futures[key] = executor.submit(contextvars.copy_context().run,
+                                               self.evaluate_key, key, expressions[key], params, modules)
+
+        try:
+            for key in pending:
+                if key not in futures:
+                    map[key] = self.evaluate_key(key, expressions[key], params, modules)
+            for key, future in futures.items():
+                map[key] = future.result()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+        self.map_inputs = {key: (inputs[key], map[key]) for key in expressions if key not in ordered}
+        self.recomputed_keys = pending
 
-            # Keys with no flag
-            pattern_no_flag = r'\$(\w+)'
-            value = re.sub(pattern_no_flag, lambda match: replace_no_flag(match, params), value)
-        
-            # Process functions
-            value = process_function(value, self.environment, self.env_dir)
-        
-        
-            # Remove variable tags
-            value = re.sub(r'<var>(.*?)\n*</var>', r'\1', value, flags=re.DOTALL)
-        
-        
-            map[key] = value
         print("Result:\n", map)
         return map
 
     def set_map(self, map_path):
-        with open(map_path) as json_file:
-            self.map = json.load(json_file)
+        # The cached dict is shared, evaluate_map writes into this copy
+        self.map = dict(json_cache.get(map_path))
     
     def set_driver(self, driver_path):
-        with open(driver_path) as shell_script:
-            self.driver = shell_script.read()
+        self.driver = text_cache.get(driver_path)
+
+    def load_additional_file(self, file_path, preview_name, preview_order, binary=False):
+        """
+        Additional file entry for the preview. Binary files and files above
+        STREAM_THRESHOLD are not loaded; they are recorded in streamed_files
+        and rendered from disk when the job is written.
+        """
+        name = os.path.basename(file_path)
+        self.streamed_files.pop(name, None)
+        size = os.path.getsize(file_path)
+        binary = binary or is_binary_file(file_path)
+        if binary or size > STREAM_THRESHOLD:
+            self.streamed_files[name] = {"source": file_path, "binary": binary, "size": size}
+            content = None
+        else:
+            content = text_cache.get(file_path)
+        return {
+                "content": content,
+                "preview_name": preview_name,
+                "preview_order": preview_order
+        }
 
     def set_additional_files(self,env_path):
         self.additional_files= {}
+        self.streamed_files = {}
         
         files_path = os.path.join(env_path, "additional_files.json")
         
         if not os.path.exists(files_path):
             return
         
-        with open(files_path, 'r') as file:
-            additional_files = json.load(file)
+        additional_files = json_cache.get(files_path)
 
         for additional_file in additional_files:
             file_name = additional_file["file_name"].strip()
@@ -330,28 +325,17 @@ class Engine():
             file_path = os.path.join(env_path, "additional_files", file_name)
         
             if os.path.isfile(file_path):
-                with open(file_path) as file:
-                     self.additional_files[os.path.basename(file_name)] = {
-                            "content": file.read(),
-                            "preview_name": preview_name,
-                            "preview_order": preview_order
-                    }
+                self.additional_files[os.path.basename(file_name)] = self.load_additional_file(
+                        file_path, preview_name, preview_order, additional_file.get("binary", False)
+                )
 
 
     def set_dynamic_additional_files(self, env_path, params):
-        user_id = os.getenv('USER')
-
         self.dynamic_additional_files = {}
         files_path = env_path
-        additional_files_path = os.path.join("/tmp", f"{user_id}.additional_files")
-        
-        if not os.path.exists(additional_files_path):
-            return 
 
-        with open(additional_files_path, 'r') as file: 
-            additional_files = json.load(file)
- 
-        for additional_file in additional_files:
+        self.context.collect()
+        for additional_file in self.context.additional_files:
                 file_name  = additional_file["file_name"].strip()
             
                 preview_name = additional_file["preview_name"].strip()
@@ -362,29 +346,13 @@ class Engine():
 
                 file_path = os.path.join(files_path, file_name)
                 if os.path.isfile(file_path):
-                    with open(file_path) as file:
-                        self.dynamic_additional_files[os.path.basename(file_name)] = {
-                                "content": file.read(),
-                                "preview_name": preview_name,
-                                "preview_order": preview_order
-                        }
-
-        os.remove(additional_files_path)
-            
-    def get_dynamic_map(self):
-        user_id = os.getenv('USER')
+                    self.dynamic_additional_files[os.path.basename(file_name)] = self.load_additional_file(
+                            file_path, preview_name, preview_order
+                    )
 
-        dynamic_map = os.path.join("/tmp", f"{user_id}.map")
-        
-        if not os.path.exists(dynamic_map):
-            return {}
-
-        with open(dynamic_map, 'r') as file:
-            map_dict = json.load(file)
-
-        os.remove(dynamic_map)
-
-        return map_dict
+    def get_dynamic_map(self):
+        self.context.collect()
+        return dict(self.context.mappings)
 
    
 
@@ -407,34 +375,19 @@ class Engine():
         return globals()
 
     def get_messages(self, params):
-        user_id = os.getenv('USER')
-        messages_path = os.path.join("/tmp", f"{user_id}.messages")
-        if not os.path.exists(messages_path):
-            return []
-
-        messages = []
-        
-        with open(messages_path, 'r') as file: 
-            messages_dict = json.load(file)
- 
-        if "messages" in messages_dict:
-            messages = messages_dict["messages"] 
-
-        os.remove(messages_path)
-
-        return messages
+        self.context.collect()
+        return list(self.context.messages)
         
 
 
     def fetch_template(self, template_path):
         try:
-            with open(template_path) as text_file:
-                template = text_file.read()
-                return template
+            return text_cache.get(template_path)
         except FileNotFoundError:
             return None
         
-    def set_environment(self, environment, env_dir):
+    def load_environment(self, environment, env_dir):
+        """Read the environment's files from disk into this engine."""
         self.environment = environment
         self.env_dir = env_dir
         self.set_driver(os.path.join(env_dir, environment, "driver.sh"))
@@ -445,121 +398,224 @@ class Engine():
             self.set_map(os.path.join(env_dir, environment, "map.json"))
         if os.path.exists(os.path.join(env_dir, environment, "schema.json")):
             self.set_schema(os.path.join(env_dir, environment, "schema.json"))
+
+    def set_environment(self, environment, env_dir):
+        """
+        Prepare the engine for an environment from the shared environment_pool.
+        Only the per-request copies of map and additional_files are mutated.
+        """
+        self.environment = environment
+        self.env_dir = env_dir
+        snapshot = environment_pool.get(environment, env_dir)
+        self.driver = snapshot.driver
+        self.additional_files = {name: dict(file) for name, file in snapshot.additional_files.items()}
+        self.streamed_files = dict(snapshot.streamed_files)
+        if snapshot.map is not None:
+            self.map = dict(snapshot.map)
+        if snapshot.schema is not None:
+            self.schema = snapshot.schema
             
     def custom_replace_with_indentation(self, template, map, params):
         """
         Replace placeholders while preserving indentation for multi-line values.
-        Could potentially be optimized.
+        The template is compiled once into a TemplatePlan so each render is a
+        single pass over the lines that actually hold placeholders.
         """
-        for key, value in map.items():
-            placeholder = "[" + key + "]"
-            lines = template.split('\n')
-            new_lines = []
-
-            for line in lines:
-                if placeholder in line:
-                    indent_match = re.match(r'^(\s*)', line)
-                    base_indent = indent_match.group(1) if indent_match else ''
-                    
-                    value_lines = str(value).split('\n')
-
-                    replaced_line = line.replace(placeholder, value_lines[0])
-                    new_lines.append(replaced_line)
-                    
-                    # Add remaining lines with proper indentation
-                    for value_line in value_lines[1:]:
-                        if value_line.strip(): 
-                            new_lines.append(base_indent + value_line)
-                        else:
-                            new_lines.append(value_line)  # Keep empty lines as-is
-                else:
-                    new_lines.append(line)
-            template = '\n'.join(new_lines)
-        return template
+        return compile_template(template).render(map)
     
     def custom_replace(self, template, map, params):
         return self.custom_replace_with_indentation(template, map, params)
 
-    def replace_placeholders(self, input_script, map, params):
-        if params['name'] == 'unnamed':
-            job_file_name = "template.txt"
-        else:
-            job_file_name = f"{params['name'].replace('-', '_').replace(' ', '_')}.job"
-        output = self.custom_replace(input_script, map, params)
-        output = output.replace("[job-file-name]", job_file_name)
+    def finish_output(self, output, params):
+        """Post-processing of rendered text shared by whole-file and line-by-line rendering."""
+        output = output.replace("[job-file-name]", job_file_name(params['name']))
         output = output.replace("\t", " ")
         output = re.sub(r'\r\n?|\r', '\n', output)
 
         return output
+
+    def replace_placeholders(self, input_script, map, params):
+        output = self.custom_replace(input_script, map, params)
+        return self.finish_output(output, params)
+
+    def preview_streamed_file(self, fname, map, params):
+        """Preview text of a streamed file: a note for binary files, otherwise the rendered head."""
+        streamed = self.streamed_files[fname]
+        if streamed["binary"]:
+            return f"[Binary file, {streamed['size']} bytes. It is copied unchanged when the job is submitted.]\n"
+        head, truncated = render_head(streamed["source"], map, PREVIEW_HEAD_BYTES,
+                                      lambda line: self.finish_output(line, params))
+        if truncated:
+            head += f"\n[Preview truncated, the file has {streamed['size']} bytes. The full file is written when the job is submitted.]\n"
+        return head
+
+    def submit_map(self, params, session=None):
+        """
+        The evaluated map for writing streamed files, reusing the preview's
+        when this engine rendered one. Evaluating it also records which
+        dynamic additional files are streamed from their source.
+        """
+        if self.evaluated_map is None:
+            raw_map = self.map
+            self.map = dict(raw_map)
+            self.context = PreviewContext()
+            try:
+                with self.context.activate():
+                    self.evaluated_map, _ = self.evaluate_preview_map(params, session)
+                    self.set_dynamic_additional_files(os.path.join(self.env_dir, self.environment), params)
+            finally:
+                self.context.close()
+                self.map = raw_map
+        return self.evaluated_map
+
+    def write_streamed_files(self, params, output_dir, names, session=None):
+        """
+        Write streamed additional files from their source: binary files are
+        copied as is (sendfile on Linux), text files are rendered line by line.
+        """
+        for fname in names:
+            streamed = self.streamed_files[fname]
+            destination = os.path.join(output_dir, fname)
+            if streamed["binary"]:
+                shutil.copyfile(streamed["source"], destination)
+            else:
+                render_file(streamed["source"], destination, self.submit_map(params, session),
+                            lambda line: self.finish_output(line, params))
     
     
-    def preview_script(self, params):
+    def preview_script(self, params, session=None, timings=False):
+        """
+        Render the job for preview. With a session key, map values whose
+        inputs did not change since that session's last preview are reused.
+        With timings, the result includes per-function and per-key timings.
+        """
         if self.environment is None:
             return "No environment selected"
         else:
-            self.drona_job_name = params["name"]
-            evaluated_map = self.evaluate_map(self.map, params)
-            
-            dynamic_map = self.get_dynamic_map()
-            
-            dynamic_evaluated_map = self.evaluate_map(dynamic_map, params)
-            evaluated_map = {**dynamic_evaluated_map, **evaluated_map}
+            preview_job = {}
+            for event in self.preview_script_iter(params, session, timings):
+                if event["type"] in ("driver", "script", "messages"):
+                    preview_job[event["type"]] = event["content"]
+                elif event["type"] == "done":
+                    preview_job["additional_files"] = self.additional_files
+                    preview_job["recomputed_keys"] = event["recomputed_keys"]
+                    if timings:
+                        preview_job["timings"] = event["timings"]
+            return preview_job
 
-            template = self.fetch_template(os.path.join(self.env_dir, self.environment, "template.txt"))
-            
-            if template is not None:
-                self.script = self.replace_placeholders(template, evaluated_map, params)
-            else:
-                self.script = None
+    def preview_script_iter(self, params, session=None, timings=False):
+        """
+        Render the job for preview as a sequence of events, each yielded as
+        soon as it is ready: "messages", "driver", "script" (only with a
+        template.txt), one "additional_file" per file and a final "done",
+        which carries the map evaluation timings when timings is set.
+        """
+        if self.environment is None:
+            yield {"type": "error", "message": "No environment selected"}
+            return
 
-            self.driver = self.replace_placeholders(self.driver, evaluated_map, params)
-            
-            self.set_dynamic_additional_files(os.path.join(self.env_dir, self.environment) ,params)
-            
-            for fname, file in self.additional_files.items():
+        # drona_add_* calls made while evaluating report into this preview only
+        self.context = PreviewContext()
+        self.timings = Timings()
+        try:
+            with self.context.activate():
+                evaluated_map, recomputed_keys = self.evaluate_preview_map(params, session)
+                self.evaluated_map = evaluated_map
+                self.set_dynamic_additional_files(os.path.join(self.env_dir, self.environment), params)
+                messages = self.get_messages(params)
+                if session is not None:
+                    preview_cache.put_streamed(session, {name: self.streamed_files[name]
+                                                         for name in self.dynamic_additional_files
+                                                         if name in self.streamed_files})
+        finally:
+            self.context.close()
+        timing_stats.add(os.path.abspath(os.path.join(self.env_dir, self.environment)), self.timings)
+
+        yield {"type": "messages", "content": messages}
+
+        self.driver = self.replace_placeholders(self.driver, evaluated_map, params)
+        yield {"type": "driver", "content": self.driver}
+
+        template = self.fetch_template(os.path.join(self.env_dir, self.environment, "template.txt"))
+        if template is not None:
+            self.script = self.replace_placeholders(template, evaluated_map, params)
+            yield {"type": "script", "content": self.script}
+        else:
+            self.script = None
+
+        # Dynamic files are rendered last and replace static files of the same name
+        for fname, file in list(self.additional_files.items()) + list(self.dynamic_additional_files.items()):
+            if fname in self.streamed_files:
+                file["content"] = self.preview_streamed_file(fname, evaluated_map, params)
+                file["streamed"] = True
+            else:
                 file["content"] = self.replace_placeholders(file["content"], evaluated_map, params)
-                self.additional_files[fname] = file
+            self.additional_files[fname] = file
+            yield {"type": "additional_file", "name": fname, "file": file}
 
-            additional_file = []
-            for fname, file in self.dynamic_additional_files.items():
+        done = {"type": "done", "recomputed_keys": recomputed_keys}
+        if timings:
+            done["timings"] = self.timings.as_dict()
+        yield done
 
-                file["content"] = self.replace_placeholders(file["content"], evaluated_map, params)
-                self.additional_files[fname] = file 
-            
-            messages = self.get_messages(params)
-
-            preview_job = {
-                    "driver": self.driver, 
-                    "messages":  messages,
-                    "additional_files": self.additional_files 
-            }
-            if self.script is not None:
-                preview_job["script"] = self.script
-            
-            return preview_job
-        
-    def generate_script(self, params):
+    def evaluate_preview_map(self, params, session=None):
+        """
+        Evaluate map.json and then the dynamic mappings added by utils.
+        Returns the merged map and the keys that were recomputed.
+        """
+        self.drona_job_name = params["name"]
+        previous = preview_cache.get(session) if session is not None else None
+        evaluated_map = self.evaluate_map(self.map, params, previous)
+        recomputed_keys = self.recomputed_keys
+        if session is not None:
+            preview_cache.put(session, self.map_inputs)
+
+        dynamic_map = self.get_dynamic_map()
+
+        dynamic_evaluated_map = self.evaluate_map(dynamic_map, params)
+        recomputed_keys = list(dict.fromkeys(recomputed_keys + self.recomputed_keys))
+        return {**dynamic_evaluated_map, **evaluated_map}, recomputed_keys
+
+    def generate_script(self, params, output_dir=None, session=None):
+        """
+        Write the job script and additional files. With output_dir (e.g. a
+        JobStage directory) files are written there instead of
+        params['location']; the returned path is always under params['location'].
+        Streamed files, static or added by drona_add_additional_file, are
+        written from their source rather than from the truncated preview the
+        client sends back.
+        """
         if self.environment is None:
             return "No environment selected"
         else:
+            output_dir = output_dir or params['location']
             if params.get("run_command") is not None:
-                if params['name'] == 'unnamed':
-                    job_file_name = "template.txt"
-                else:
-                    job_file_name = f"{params['name'].replace('-', '_').replace(' ', '_')}.job"
-                job_file_path = os.path.join(params['location'], job_file_name)
+                job_file_path = os.path.join(params['location'], job_file_name(params['name']))
                 # Create a file with the job script
-                with open(job_file_path, "w") as job_file:
+                with open(os.path.join(output_dir, job_file_name(params['name'])), "w") as job_file:
                     self.script = params["run_command"]
                     self.script = self.script.replace("\t", " ")
                     self.script = re.sub(r'\r\n?|\r', '\n', self.script)
                     job_file.write(self.script)
 
+            static_files = self.additional_files
             self.additional_files = json.loads(params["additional_files"])
+            if any(fname not in static_files for fname in self.additional_files):
+                # Dynamic files are streamed or not as the session's preview found, and
+                # are only known by evaluating the map again without one
+                recorded = preview_cache.streamed(session) if session is not None else None
+                if recorded is not None:
+                    self.streamed_files.update(recorded)
+                else:
+                    self.submit_map(params, session)
+            streamed = [fname for fname in self.additional_files if fname in self.streamed_files]
+            self.write_streamed_files(params, output_dir, streamed, session)
             for fname, content in self.additional_files.items():
+                if fname in self.streamed_files:
+                    continue
                 # Copy  files with the job script
                 nfile=content
-                additional_job_file_path = os.path.join(params['location'], fname)
+                additional_job_file_path = os.path.join(output_dir, fname)
                 with open(os.path.join(additional_job_file_path), "w") as ajob_file:
                     nfile = self.replace_placeholders(nfile, self.map, params)
                     ajob_file.write(nfile)
@@ -569,12 +625,12 @@ class Engine():
             else:
                 return None
     
-    def generate_driver_script(self, params):
+    def generate_driver_script(self, params, output_dir=None):
         if self.environment is None:
             return "No environment selected"
         else:
             bash_file_path = os.path.join(params['location'], "run.sh")
-            with open(bash_file_path, "w") as bash_file:
+            with open(os.path.join(output_dir or params['location'], "run.sh"), "w") as bash_file:
                 self.driver = params["driver"]
                 self.driver = self.driver.replace("\t", " ")
                 self.driver = re.sub(r'\r\n?|\r', '\n', self.driver)
@@ -584,12 +640,34 @@ class Engine():
             return bash_file_path
 
 
+
+def load_environment_snapshot(env_path):
+    """Loader for environment_pool: read env_path into an EnvironmentSnapshot."""
+    engine = Engine()
+    engine.load_environment(os.path.basename(env_path), os.path.dirname(env_path))
+
+    paths = [env_path] + [os.path.join(env_path, name) for name in ENVIRONMENT_FILES]
+    files_path = os.path.join(env_path, "additional_files.json")
+    if os.path.exists(files_path):
+        for additional_file in json_cache.get(files_path):
+            paths.append(os.path.join(env_path, "additional_files", additional_file["file_name"].strip()))
+
+    return EnvironmentSnapshot(engine.driver, engine.map, engine.schema, engine.additional_files,
+                               engine.streamed_files, paths)
+
+# Prepared environments shared by every request in this process
+environment_pool = EnvironmentPool(
+    load_environment_snapshot,
+    maxsize=int(os.getenv("DRONA_ENV_POOL_SIZE", "32")),
+    max_bytes=int(os.getenv("DRONA_ENV_POOL_BYTES", str(64 * 1024 * 1024)))
+)
+
             
 def main():
     parser = argparse.ArgumentParser(description = "Engine")
 
     # argument for params dictionary
-    parser.add_argument("-p", "--params", type = str, help = "Params Dictionary")
+    parser.add_argument("-p", "--params", type = str, help = "Params Dictionary (JSON or a Python literal)")
     parser.add_argument("-s", "--script", action="store_true", help = "Generate Script")
     parser.add_argument("-t", "--tamubatch", action="store_true", help = "Generate TamuBatch Command")
     parser.add_argument("-j", "--preview", action="store_true", help = "Preview Script")
@@ -599,7 +677,10 @@ def main():
     engine = Engine()
     if args.params:
         try:
-            params = ast.literal_eval(args.params)  # Safely parse the dictionary string
+            try:
+                params = json.loads(args.params)
+            except json.JSONDecodeError:
+                params = ast.literal_eval(args.params)  # Safely parse the dictionary string
             if isinstance(params, dict):
                 engine.set_environment(params["runtime"], params["env_dir"])
             else:
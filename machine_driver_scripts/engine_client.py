@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Thin client for the engine daemon (engine_daemon.py).
+
+    python -m machine_driver_scripts.engine_client preview -p '{"runtime": ..., "env_dir": ...}'
+    python -m machine_driver_scripts.engine_client script -p @params.json
+    python -m machine_driver_scripts.engine_client stats
+
+Only the standard library is imported here, so a call costs an interpreter
+start and one round trip on the daemon's Unix socket. The daemon is started
+in the background when it is not running yet, unless --no-start is given.
+"""
+import argparse
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ACTIONS = ("preview", "script", "ping", "stats", "shutdown")
+
+# Seconds to wait for a daemon started by the client to accept connections
+START_TIMEOUT = 10
+
+
+def fallback_socket_dir():
+    """Per-user directory, created with mode 0700, for the socket when XDG_RUNTIME_DIR is unset."""
+    return os.path.join("/tmp", f"drona-engine-{os.getuid()}")
+
+
+def socket_path():
+    """Per-user socket of the engine daemon, overridable with DRONA_ENGINE_SOCKET."""
+    path = os.getenv("DRONA_ENGINE_SOCKET")
+    if path:
+        return path
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "drona-engine.sock")
+    return os.path.join(fallback_socket_dir(), "engine.sock")
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+class UntrustedDaemon(Exception):
+    pass
+
+
+def peer_is_same_user(sock, path):
+    """Whether the process behind a connected socket runs as this user: SO_PEERCRED, else the socket's owner."""
+    if hasattr(socket, "SO_PEERCRED"):
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == os.getuid()
+    return os.stat(path).st_uid == os.getuid()
+
+
+def absolute_paths(params):
+    """A copy of params whose env_dir and location are resolved against this process's working directory."""
+    if not isinstance(params, dict):
+        return params
+    params = dict(params)
+    for key in ("env_dir", "location"):
+        if isinstance(params.get(key), str) and params[key].strip():
+            params[key] = os.path.abspath(params[key])
+    return params
+
+
+def request(action, params=None, path=None, timeout=None):
+    """
+    Send one request to the daemon and return its decoded response. Raises
+    UntrustedDaemon, before sending anything, when the socket is served by
+    another user.
+    """
+    path = path or socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        sock.close()
+        raise DaemonUnavailable(f"No engine daemon listening on {path}") from e
+    if not peer_is_same_user(sock, path):
+        sock.close()
+        raise UntrustedDaemon(f"{path} is served by another user")
+
+    message = {"action": action, "params": absolute_paths(params), "cwd": os.getcwd(), "env": dict(os.environ)}
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(message).encode() + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        raise DaemonUnavailable("Engine daemon closed the connection")
+    return json.loads(line)
+
+
+def start_daemon(path=None):
+    """Start the daemon in the background and wait until it answers."""
+    path = path or socket_path()
+    env = dict(os.environ, DRONA_ENGINE_SOCKET=path)
+    subprocess.Popen(
+        [sys.executable, "-m", "machine_driver_scripts.engine_daemon"],
+        cwd=ROOT, env=env, start_new_session=True,
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            return request("ping", path=path)
+        except DaemonUnavailable:
+            time.sleep(0.05)
+    raise DaemonUnavailable(f"Engine daemon did not start on {path}")
+
+
+def load_params(value):
+    """Params as a JSON object, or @file to read them from a file ('-' for stdin)."""
+    if value is None:
+        return None
+    if value.startswith("@"):
+        name = value[1:]
+        value = sys.stdin.read() if name == "-" else open(name).read()
+    params = json.loads(value)
+    if not isinstance(params, dict):
+        raise ValueError("params must be a JSON object")
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine daemon client")
+    parser.add_argument("action", choices=ACTIONS)
+    parser.add_argument("-p", "--params", help="Params as a JSON object, or @file")
+    parser.add_argument("--socket", help="Daemon socket path")
+    parser.add_argument("--no-start", action="store_true", help="Fail instead of starting the daemon")
+    args = parser.parse_args()
+
+    try:
+        params = load_params(args.params)
+    except (OSError, ValueError) as e:
+        parser.error(f"Invalid params: {e}")
+    if args.action in ("preview", "script") and params is None:
+        parser.error("No params provided")
+
+    try:
+        response = request(args.action, params, args.socket)
+    except DaemonUnavailable:
+        if args.no_start or args.action == "shutdown":
+            raise
+        start_daemon(args.socket)
+        response = request(args.action, params, args.socket)
+
+    if "error" in response:
+        print(json.dumps(response), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(response["result"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Long-lived engine process serving preview and generate requests on a
+per-user Unix socket, so repeated calls reuse warm environments, utils
+modules and compiled templates instead of starting a new interpreter.
+
+    python -m machine_driver_scripts.engine_daemon [--socket PATH] [--idle-timeout SECONDS]
+
+Each connection sends one JSON line {"action": ..., "params": {...},
+"cwd": ..., "env": {...}} and receives one JSON line {"result": ...} or
+{"error": ...}. Actions are preview and script (as in engine.py's -j and
+-s), ping, stats and shutdown. Preview and script requests run one at a
+time in the caller's working directory and environment, so utils see the
+same os.environ and relative paths as with engine.py. See engine_client.py
+for the matching client.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from machine_driver_scripts.engine import Engine, environment_pool
+from machine_driver_scripts.engine_client import socket_path, fallback_socket_dir, request, DaemonUnavailable
+from machine_driver_scripts.timings import timing_stats
+
+# Seconds without requests after which the daemon exits
+IDLE_TIMEOUT = int(os.getenv("DRONA_ENGINE_DAEMON_IDLE", "1800"))
+
+
+# Working directory and os.environ are process-wide, so requests that apply a caller's take turns
+caller_lock = threading.Lock()
+
+
+@contextmanager
+def caller_environment(cwd, env):
+    """Run the block in the caller's working directory and environment, restoring the daemon's after."""
+    with caller_lock:
+        saved_cwd, saved_env = os.getcwd(), dict(os.environ)
+        try:
+            if env is not None:
+                os.environ.clear()
+                os.environ.update(env)
+            if cwd:
+                os.chdir(cwd)
+            yield
+        finally:
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+
+def handle_request(message):
+    """Result of one daemon request."""
+    action = message.get("action")
+    params = message.get("params")
+
+    if action in ("ping", "shutdown"):
+        return {"pid": os.getpid()}
+    if action == "stats":
+        return {"environment_pool": environment_pool.stats(), "timings": timing_stats.summary()}
+    if action not in ("preview", "script"):
+        raise ValueError(f"Unknown action: {action}")
+    if not isinstance(params, dict):
+        raise ValueError("params must be a JSON object")
+
+    params = dict(params)
+    with caller_environment(message.get("cwd"), message.get("env")):
+        engine = Engine()
+        engine.set_environment(params["runtime"], params["env_dir"])
+        if action == "preview":
+            session = None
+            if params.get("drona_job_id"):
+                session = (os.path.abspath(os.path.join(params["env_dir"], params["runtime"])), params["drona_job_id"])
+            return engine.preview_script(params, session=session)
+        return engine.generate_script(params)
+
+
+class EngineRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        if not self.server.same_user(self.request):
+            return
+        self.server.touch()
+        try:
+            message = json.loads(self.rfile.readline())
+            response = {"result": handle_request(message)}
+        except Exception as e:
+            message = None
+            response = {"error": str(e), "traceback": traceback.format_exc()}
+        self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+        self.wfile.flush()
+        if message and message.get("action") == "shutdown":
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class EngineDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, idle_timeout=IDLE_TIMEOUT):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.last_request = time.monotonic()
+        self._prepare_directory()
+        self._remove_stale_socket()
+        # Only the owner may connect to the socket
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, EngineRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def _prepare_directory(self):
+        """Create the default socket directory private to this user, refusing one anyone else controls."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory != fallback_socket_dir():
+            return
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        st = os.lstat(directory)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise RuntimeError(f"{directory} must be a directory owned by this user with mode 0700")
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            request("ping", path=self.path, timeout=2)
+        except (DaemonUnavailable, OSError):
+            os.unlink(self.path)
+            return
+        raise RuntimeError(f"An engine daemon is already listening on {self.path}")
+
+    def same_user(self, connection):
+        """Reject peers running as another user where the platform reports credentials."""
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+        credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == os.getuid()
+
+    def touch(self):
+        self.last_request = time.monotonic()
+
+    def watch_idle(self):
+        while True:
+            time.sleep(min(self.idle_timeout, 30))
+            if time.monotonic() - self.last_request >= self.idle_timeout:
+                self.shutdown()
+                return
+
+    def serve(self):
+        if self.idle_timeout > 0:
+            threading.Thread(target=self.watch_idle, daemon=True).start()
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine daemon")
+    parser.add_argument("--socket", help="Socket path (default: per-user socket, see DRONA_ENGINE_SOCKET)")
+    parser.add_argument("--idle-timeout", type=int, default=IDLE_TIMEOUT,
+                        help="Exit after this many seconds without requests, 0 to never exit")
+    args = parser.parse_args()
+
+    EngineDaemon(args.socket or socket_path(), args.idle_timeout).serve()
+
+if __name__ == "__main__":
+    main()
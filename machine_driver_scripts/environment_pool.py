@@ -0,0 +1,108 @@
+import os
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+# Files every snapshot depends on, relative to the environment directory
+ENVIRONMENT_FILES = ("driver.sh", "map.json", "schema.json", "additional_files.json", "additional_files")
+
+
+def file_signature(paths):
+    """(path, mtime_ns, size) for every path, with None for missing ones."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class EnvironmentSnapshot:
+    """
+    Read-only view of an environment as loaded from disk.
+
+    map and additional_files are mapping proxies; Engine.set_environment
+    copies what it mutates. paths lists every file the snapshot was built
+    from, so the pool can tell when it is stale. Streamed files are only
+    referenced by path and do not count towards size.
+    """
+    __slots__ = ("driver", "map", "schema", "additional_files", "streamed_files", "paths", "signature", "size")
+
+    def __init__(self, driver, map, schema, additional_files, streamed_files, paths):
+        self.driver = driver
+        self.map = MappingProxyType(dict(map)) if map is not None else None
+        self.schema = schema
+        self.additional_files = MappingProxyType({
+            name: MappingProxyType(dict(file)) for name, file in additional_files.items()
+        })
+        self.streamed_files = MappingProxyType({
+            name: MappingProxyType(dict(file)) for name, file in streamed_files.items()
+        })
+        self.paths = tuple(paths)
+        self.signature = file_signature(self.paths)
+        sources = {file["source"] for file in streamed_files.values()}
+        self.size = sum(size or 0 for path, _, size in self.signature if path not in sources)
+
+
+class EnvironmentPool:
+    """
+    Process-wide LRU of EnvironmentSnapshots keyed by environment directory.
+
+    A lookup restats the snapshot's files and reloads it through loader(env_path)
+    when any of them changed. The pool holds at most maxsize snapshots whose
+    files add up to at most max_bytes.
+    """
+    def __init__(self, loader, maxsize=32, max_bytes=64 * 1024 * 1024):
+        self._loader = loader
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, environment, env_dir):
+        env_path = os.path.abspath(os.path.join(env_dir, environment))
+
+        with self._lock:
+            snapshot = self._entries.get(env_path)
+        if snapshot is not None and file_signature(snapshot.paths) == snapshot.signature:
+            with self._lock:
+                if env_path in self._entries:
+                    self._entries.move_to_end(env_path)
+                self._hits += 1
+            return snapshot
+
+        snapshot = self._loader(env_path)
+
+        with self._lock:
+            self._misses += 1
+            old = self._entries.pop(env_path, None)
+            if old is not None:
+                self._bytes -= old.size
+            if snapshot.size <= self._max_bytes:
+                self._entries[env_path] = snapshot
+                self._bytes += snapshot.size
+                while len(self._entries) > self._maxsize or self._bytes > self._max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.size
+        return snapshot
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+                "bytes": self._bytes,
+                "max_bytes": self._max_bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,117 @@
+import os
+import shutil
+import uuid
+
+
+def _holds(path, data):
+    """Whether the file at path contains exactly data; a size mismatch is settled by one stat."""
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+class JobStage:
+    """
+    Builds a job directory in a staging directory and moves it into place.
+
+    When location does not exist yet and its parent is writable, files are
+    staged in a hidden sibling that commit() renames to location, so the
+    job directory appears complete in one step. Otherwise they are staged in
+    a hidden directory inside location and commit() moves each one over its
+    counterpart with os.replace. Each file is then replaced atomically, but
+    readers can see some files updated before others. Uploads identical to
+    the file already in location are hardlinked to it rather than written
+    again, and commit() leaves those in place. On error the staging
+    directory and any directories created for it are removed, so a failed
+    submit never leaves a partial job directory behind.
+
+        with JobStage(location) as stage:
+            write files under stage.path
+    """
+    def __init__(self, location):
+        self.location = os.path.abspath(location)
+        self._created = []
+        parent, name = os.path.split(self.location)
+        token = uuid.uuid4().hex[:12]
+        if not os.path.exists(self.location) and os.path.isdir(parent) and os.access(parent, os.W_OK):
+            self.path = os.path.join(parent, f".{name}.staging-{token}")
+        else:
+            self._makedirs(self.location)
+            self.path = os.path.join(self.location, f".staging-{token}")
+        # mkdir rather than mkdtemp so the directory gets the usual umask permissions
+        os.mkdir(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def _makedirs(self, path):
+        """os.makedirs that remembers which directories it created, for abort()."""
+        missing = []
+        while not os.path.isdir(path):
+            missing.append(path)
+            path = os.path.dirname(path)
+        for directory in reversed(missing):
+            try:
+                os.mkdir(directory)
+            except FileExistsError:
+                continue
+            self._created.append(directory)
+
+    def final_path(self, staged_path):
+        """Where a file written under the staging directory ends up after commit()."""
+        return os.path.join(self.location, os.path.relpath(staged_path, self.path))
+
+    def save_upload(self, file):
+        """
+        Stage an uploaded file under its (possibly nested) filename and
+        return the staged path. If location already holds the same bytes
+        under that name, the existing file is hardlinked instead of written.
+        """
+        data = file.read()
+        staged = os.path.join(self.path, file.filename)
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        existing = self.final_path(staged)
+        if _holds(existing, data):
+            try:
+                os.link(existing, staged)
+                return staged
+            except OSError:
+                pass  # Not linkable (e.g. another filesystem), write a copy
+        with open(staged, "wb") as f:
+            f.write(data)
+        return staged
+
+    def commit(self):
+        if os.path.dirname(self.path) != self.location and not os.path.exists(self.location):
+            try:
+                os.rename(self.path, self.location)
+                return
+            except OSError:
+                pass  # Created concurrently, merge into it instead
+
+        for root, dirs, files in os.walk(self.path):
+            target_root = os.path.join(self.location, os.path.relpath(root, self.path))
+            os.makedirs(target_root, exist_ok=True)
+            for file_name in files:
+                # Renaming a hardlink over the file it links to is a no-op
+                os.replace(os.path.join(root, file_name), os.path.join(target_root, file_name))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        for directory in reversed(self._created):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
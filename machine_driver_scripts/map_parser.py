@@ -0,0 +1,371 @@
+import re
+from functools import lru_cache
+
+# Token kinds produced by tokenize()
+VAR_OPEN = "VAR_OPEN"
+VAR_CLOSE = "VAR_CLOSE"
+FLAG = "FLAG"
+PARAM = "PARAM"
+CALL = "CALL"
+LPAREN = "LPAREN"
+RPAREN = "RPAREN"
+COMMA = "COMMA"
+QUOTE = "QUOTE"
+ESCAPE = "ESCAPE"
+TEXT = "TEXT"
+
+TOKEN_RE = re.compile(r'''
+    (?P<VAR_OPEN><var>)
+  | (?P<VAR_CLOSE></var>)
+  | (?P<FLAG>-(?P<flag>[^\n])\ \$(?P<flag_param>\w+))
+  | (?P<PARAM>\$(?P<param>\w+))
+  | (?P<CALL>!(?P<func>\w+)\()
+  | (?P<LPAREN>\()
+  | (?P<RPAREN>\))
+  | (?P<COMMA>,)
+  | (?P<QUOTE>["'])
+  | (?P<ESCAPE>\\["'\\])
+  | (?P<TEXT>[^<$!(),"'\\-]+|.)
+''', re.VERBOSE | re.DOTALL)
+
+
+class Token:
+    __slots__ = ("kind", "text", "value")
+
+    def __init__(self, kind, text, value=None):
+        self.kind = kind
+        self.text = text
+        self.value = value
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r})"
+
+
+def tokenize(source):
+    """Split a map value into tokens; concatenating token texts gives back the source."""
+    tokens = []
+    for match in TOKEN_RE.finditer(source):
+        kind = match.lastgroup
+        if kind == FLAG:
+            value = (match.group("flag"), match.group("flag_param"))
+        elif kind == PARAM:
+            value = match.group("param")
+        elif kind == CALL:
+            value = match.group("func")
+        else:
+            value = None
+        tokens.append(Token(kind, match.group(0), value))
+    return tokens
+
+
+class Text:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f"Text({self.text!r})"
+
+class Param:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Param({self.name!r})"
+
+class Flag:
+    """A "-x $param" pair, rendered as "-x <var>value</var>"."""
+    __slots__ = ("flag", "name")
+
+    def __init__(self, flag, name):
+        self.flag = flag
+        self.name = name
+
+    def __repr__(self):
+        return f"Flag({self.flag!r}, {self.name!r})"
+
+class VarTag:
+    """Text wrapped in <var>...</var>; function calls are not recognized inside."""
+    __slots__ = ("children", "closed")
+
+    def __init__(self, children, closed=True):
+        self.children = children
+        self.closed = closed
+
+    def __repr__(self):
+        return f"VarTag({self.children!r}, closed={self.closed})"
+
+class Quoted:
+    __slots__ = ("quote", "children")
+
+    def __init__(self, quote, children):
+        self.quote = quote
+        self.children = children
+
+    def __repr__(self):
+        return f"Quoted({self.quote!r}, {self.children!r})"
+
+class Call:
+    """!name(arg, ...); every argument is a list of nodes."""
+    __slots__ = ("name", "args")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        return f"Call({self.name!r}, {self.args!r})"
+
+
+class Expression:
+    """Parsed map value. params holds every $param it references."""
+    __slots__ = ("source", "nodes", "params", "calls")
+
+    def __init__(self, source, nodes):
+        self.source = source
+        self.nodes = nodes
+        self.params = set()
+        self.calls = []
+        _collect(nodes, self.params, self.calls)
+
+    @property
+    def has_calls(self):
+        return bool(self.calls)
+
+    def __repr__(self):
+        return f"Expression({self.nodes!r})"
+
+def _collect(nodes, params, calls):
+    for node in nodes:
+        if isinstance(node, (Param, Flag)):
+            params.add(node.name)
+        elif isinstance(node, (VarTag, Quoted)):
+            _collect(node.children, params, calls)
+        elif isinstance(node, Call):
+            calls.append(node.name)
+            for arg in node.args:
+                _collect(arg, params, calls)
+
+
+class _Unterminated(Exception):
+    pass
+
+class Parser:
+    """
+    Recursive descent parser over tokenize() output.
+
+    Grammar (informally):
+        value   := (text | param | flag | var | call)*
+        var     := "<var>" (text | param | flag)* "</var>"
+        call    := "!" name "(" [arg ("," arg)*] ")"
+        arg     := (text | param | flag | var | call | quoted | "(" ... ")")*
+        quoted  := quote (text | param | flag | var | escape)* quote
+
+    A call, quote or var tag that is never closed is kept as literal text.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.tokens = tokenize(source)
+        self.pos = 0
+
+    def parse(self):
+        nodes = []
+        while self.pos < len(self.tokens):
+            nodes.append(self._atom(self.tokens[self.pos], allow_calls=True))
+        return Expression(self.source, _merge_text(nodes))
+
+    def _atom(self, tok, allow_calls, allow_var=True):
+        if tok.kind == PARAM:
+            self.pos += 1
+            return Param(tok.value)
+        if tok.kind == FLAG:
+            self.pos += 1
+            return Flag(*tok.value)
+        if tok.kind == VAR_OPEN and allow_var:
+            return self._var()
+        if tok.kind == CALL and allow_calls:
+            start = self.pos
+            try:
+                return self._call()
+            except _Unterminated:
+                self.pos = start + 1
+                return Text(tok.text)
+        self.pos += 1
+        return Text(tok.text)
+
+    def _var(self):
+        self.pos += 1
+        children = []
+        while self.pos < len(self.tokens):
+            tok = self.tokens[self.pos]
+            if tok.kind == VAR_CLOSE:
+                self.pos += 1
+                return VarTag(_merge_text(children))
+            children.append(self._atom(tok, allow_calls=False, allow_var=False))
+        return VarTag(_merge_text(children), closed=False)
+
+    def _call(self):
+        name = self.tokens[self.pos].value
+        self.pos += 1
+        args = []
+        while True:
+            arg = self._arg()
+            if self.pos >= len(self.tokens):
+                raise _Unterminated()
+            args.append(arg)
+            tok = self.tokens[self.pos]
+            self.pos += 1
+            if tok.kind == RPAREN:
+                break
+        args = [_strip_nodes(arg) for arg in args]
+        # A trailing empty argument is dropped, so "!f()" and "!f(a,)" take 0 and 1 args
+        if not args[-1]:
+            args.pop()
+        return Call(name, args)
+
+    def _arg(self):
+        nodes = []
+        depth = 0
+        while self.pos < len(self.tokens):
+            tok = self.tokens[self.pos]
+            if depth == 0 and tok.kind in (COMMA, RPAREN):
+                break
+            if tok.kind == LPAREN:
+                depth += 1
+            elif tok.kind == RPAREN:
+                depth -= 1
+            if tok.kind == QUOTE:
+                nodes.append(self._quoted(tok.text))
+            elif tok.kind == CALL:
+                nodes.append(self._call())
+            else:
+                nodes.append(self._atom(tok, allow_calls=False))
+        return _merge_text(nodes)
+
+    def _quoted(self, quote):
+        self.pos += 1
+        children = []
+        while self.pos < len(self.tokens):
+            tok = self.tokens[self.pos]
+            if tok.kind == QUOTE and tok.text == quote:
+                self.pos += 1
+                return Quoted(quote, _merge_text(children))
+            if tok.kind == ESCAPE:
+                self.pos += 1
+                escaped = tok.text[1]
+                children.append(Text(escaped if escaped in (quote, "\\") else tok.text))
+            else:
+                children.append(self._atom(tok, allow_calls=False))
+        raise _Unterminated()
+
+
+def _merge_text(nodes):
+    merged = []
+    for node in nodes:
+        if isinstance(node, Text) and merged and isinstance(merged[-1], Text):
+            merged[-1] = Text(merged[-1].text + node.text)
+        else:
+            merged.append(node)
+    return merged
+
+def _strip_nodes(nodes):
+    """Trim surrounding whitespace of an argument, like str.strip() on its text."""
+    nodes = list(nodes)
+    if nodes and isinstance(nodes[0], Text):
+        text = nodes[0].text.lstrip()
+        nodes = ([Text(text)] if text else []) + nodes[1:]
+    if nodes and isinstance(nodes[-1], Text):
+        text = nodes[-1].text.rstrip()
+        nodes = nodes[:-1] + ([Text(text)] if text else [])
+    return nodes
+
+
+@lru_cache(maxsize=4096)
+def parse_map_value(source):
+    """Parse a map value into an Expression. Results are cached per source string."""
+    return Parser(source).parse()
+
+
+class FunctionNotFound(Exception):
+    def __init__(self, name):
+        super().__init__(name)
+        self.name = name
+
+
+def _render_param(name, params):
+    if name in params:
+        return f"<var>{params[name]}</var>"
+    return "$" + name
+
+def _render(nodes, params, results):
+    out = []
+    for node in nodes:
+        if isinstance(node, Text):
+            out.append(node.text)
+        elif isinstance(node, Param):
+            out.append(_render_param(node.name, params))
+        elif isinstance(node, Flag):
+            out.append(f"-{node.flag} " + _render_param(node.name, params))
+        elif isinstance(node, VarTag):
+            out.append("<var>" + _render(node.children, params, results))
+            if node.closed:
+                out.append("</var>")
+        elif isinstance(node, Quoted):
+            out.append(node.quote + _render(node.children, params, results) + node.quote)
+        elif isinstance(node, Call):
+            out.append(results[id(node)])
+    return "".join(out)
+
+def _plain(nodes, params, call):
+    """Argument text as the function receives it: values untagged, quotes removed."""
+    if len(nodes) == 1 and isinstance(nodes[0], Quoted):
+        nodes = nodes[0].children
+    out = []
+    for node in nodes:
+        if isinstance(node, Text):
+            out.append(node.text)
+        elif isinstance(node, Param):
+            out.append(str(params[node.name]) if node.name in params else "$" + node.name)
+        elif isinstance(node, Flag):
+            value = str(params[node.name]) if node.name in params else "$" + node.name
+            out.append(f"-{node.flag} {value}")
+        elif isinstance(node, VarTag):
+            out.append(_plain(node.children, params, call))
+        elif isinstance(node, Quoted):
+            out.append(node.quote + _plain(node.children, params, call) + node.quote)
+        elif isinstance(node, Call):
+            out.append(call(node))
+    return "".join(out)
+
+def evaluate(expression, params, resolve):
+    """
+    Render an Expression against form params.
+
+    resolve(name) returns the callable behind !name(...) or None; a missing
+    function raises FunctionNotFound. Top-level calls run right to left and
+    exceptions they raise become "Error: ..." text. $param values stay wrapped
+    in <var> tags for the caller to strip.
+    """
+    results = {}
+
+    def call(node):
+        function = resolve(node.name)
+        if function is None:
+            raise FunctionNotFound(node.name)
+        args = [_plain(arg, params, call) for arg in node.args]
+        try:
+            result = function(*args)
+        except Exception as e:
+            result = f"Error: {e}"
+        if result is None:
+            result = ""
+        return str(result)
+
+    for node in reversed(expression.nodes):
+        if isinstance(node, Call):
+            results[id(node)] = call(node)
+
+    return _render(expression.nodes, params, results)
@@ -0,0 +1,169 @@
+import hashlib
+import importlib.util
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DRIVER_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGES_DIR = os.path.join(os.path.dirname(DRIVER_SCRIPTS_DIR), 'packages')
+GLOBAL_UTILS_PATH = os.path.join(DRIVER_SCRIPTS_DIR, "utils.py")
+
+
+def _tree_signature(root):
+    """(path, mtime_ns, size) for root and every entry below it, or None if missing."""
+    if not os.path.exists(root):
+        return None
+    signature = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        st = os.stat(current)
+        signature.append((current, st.st_mtime_ns, st.st_size))
+        if os.path.isdir(current):
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.name == '__pycache__':
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        st = entry.stat()
+                        signature.append((entry.path, st.st_mtime_ns, st.st_size))
+    return tuple(sorted(signature))
+
+def _is_under(module, root):
+    prefix = root.rstrip(os.sep) + os.sep
+    file_path = getattr(module, '__file__', None)
+    if file_path:
+        return os.path.abspath(file_path).startswith(prefix)
+    paths = getattr(module, '__path__', None) or []
+    return any(os.path.abspath(p).startswith(prefix) for p in paths)
+
+
+class UtilsModuleCache:
+    """
+    Keeps the global utils module and each environment's utils.py loaded
+    between previews.
+
+    Environments are keyed by their absolute directory and revalidated
+    against the mtimes of utils.py and utils_scripts/, so a module is only
+    re-executed after one of those files changes. Helper modules an
+    environment imports from its own directory are removed from sys.modules
+    after loading, so two environments with a same-named helper never see
+    each other's copy.
+    """
+    def __init__(self, maxsize=32):
+        self._maxsize = maxsize
+        self._global = None
+        self._local = OrderedDict()
+        self._lock = threading.RLock()
+        self._path_refs = {}
+
+    @contextmanager
+    def activate(self, module_dir, isolate=True):
+        """
+        Put the environment's import paths on sys.path for the duration of the block.
+        With isolate, modules imported from module_dir are dropped from sys.modules on exit.
+        """
+        paths = [module_dir, PACKAGES_DIR, os.path.join(module_dir, 'utils_scripts')]
+        paths = [p for p in paths if os.path.isdir(p)]
+        before = set(sys.modules)
+        with self._lock:
+            for path in paths:
+                if self._path_refs.get(path, 0) == 0 and path not in sys.path:
+                    sys.path.insert(0, path)
+                    self._path_refs[path] = 1
+                elif path in self._path_refs:
+                    self._path_refs[path] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for path in paths:
+                    if path not in self._path_refs:
+                        continue
+                    self._path_refs[path] -= 1
+                    if self._path_refs[path] == 0:
+                        del self._path_refs[path]
+                        while path in sys.path:
+                            sys.path.remove(path)
+                if isolate:
+                    for name in set(sys.modules) - before:
+                        module = sys.modules.get(name)
+                        if module is not None and _is_under(module, module_dir):
+                            del sys.modules[name]
+
+    def _load(self, module_name, file_path, isolate=True):
+        module = None
+        with self.activate(os.path.dirname(file_path), isolate=isolate):
+            try:
+                spec = importlib.util.spec_from_file_location(module_name, file_path)
+                if spec and spec.loader:
+                    module = importlib.util.module_from_spec(spec)
+                    # Add the module to sys.modules before execution. This is crucial
+                    # for relative imports (e.g., from . import other_file) to work.
+                    sys.modules[module_name] = module
+                    spec.loader.exec_module(module)
+            except Exception as e:
+                print("Import error:", e)
+                module = None
+
+        if module is not None:
+            sys.modules[module_name] = module
+        else:
+            sys.modules.pop(module_name, None)
+        return module
+
+    def get_global(self):
+        signature = _tree_signature(GLOBAL_UTILS_PATH)
+        with self._lock:
+            if self._global is None or self._global[0] != signature:
+                self._global = (signature, self._load("global_utils", GLOBAL_UTILS_PATH, isolate=False))
+            return self._global[1]
+
+    def get(self, environment, env_dir):
+        """Return (global_module, local_module); local_module is None without a utils.py."""
+        global_module = self.get_global()
+
+        module_dir = os.path.abspath(os.path.join(env_dir, environment))
+        local_path = os.path.join(module_dir, "utils.py")
+        if not os.path.exists(local_path):
+            return global_module, None
+
+        signature = (
+            id(global_module),
+            _tree_signature(local_path),
+            _tree_signature(os.path.join(module_dir, 'utils_scripts'))
+        )
+        with self._lock:
+            entry = self._local.get(module_dir)
+            if entry is not None and entry[0] == signature:
+                self._local.move_to_end(module_dir)
+                return global_module, entry[1]
+
+            # Unique per directory, two env_dirs may hold an environment of the same name
+            digest = hashlib.sha1(module_dir.encode()).hexdigest()[:12]
+            local_module = self._load(f"local_utils_{environment}_{digest}", local_path)
+
+            # Make global functions available to the local module
+            if global_module and local_module:
+                for func_name in dir(global_module):
+                    if callable(getattr(global_module, func_name)):
+                        setattr(local_module, func_name, getattr(global_module, func_name))
+
+            self._local[module_dir] = (signature, local_module)
+            self._local.move_to_end(module_dir)
+            while len(self._local) > self._maxsize:
+                self._local.popitem(last=False)
+            return global_module, local_module
+
+    def clear(self):
+        """Forget every loaded module, so the next get() executes them again."""
+        with self._lock:
+            self._global = None
+            self._local.clear()
+
+
+utils_module_cache = UtilsModuleCache()
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+
+class PreviewCache:
+    """
+    Last evaluated map of each preview session, so a repeat preview only
+    re-evaluates the keys whose inputs changed.
+
+    A session is any hashable key, the job routes use the environment path
+    and drona_job_id. Each entry maps a map key to (inputs, value) as
+    recorded by Engine.evaluate_map. The dynamic additional files a session's
+    preview found to be streamed are kept too, so submitting the job does
+    not have to evaluate the map again to find them.
+    """
+    def __init__(self, maxsize=64):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._streamed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session):
+        with self._lock:
+            entry = self._entries.get(session)
+            if entry is not None:
+                self._entries.move_to_end(session)
+            return entry
+
+    def put(self, session, evaluated):
+        with self._lock:
+            self._entries[session] = evaluated
+            self._entries.move_to_end(session)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def streamed(self, session):
+        """Streamed dynamic files recorded by the session's last preview, or None without one."""
+        with self._lock:
+            return self._streamed.get(session)
+
+    def put_streamed(self, session, streamed_files):
+        with self._lock:
+            self._streamed[session] = streamed_files
+            self._streamed.move_to_end(session)
+            while len(self._streamed) > self._maxsize:
+                self._streamed.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._streamed.clear()
+
+
+preview_cache = PreviewCache()
@@ -0,0 +1,196 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+PLACEHOLDER_RE = re.compile(r'\[([^\[\]\n]+)\]')
+
+
+class FileCache:
+    """
+    Process-wide cache of loaded files keyed by absolute path.
+    Entries are revalidated against (mtime_ns, size) on every lookup, so an
+    unchanged file costs one stat instead of a read and parse.
+    """
+    def __init__(self, loader, maxsize=512):
+        self._loader = loader
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = self._loader(key)
+
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _load_text(path):
+    with open(path) as f:
+        return f.read()
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+# Parsed JSON objects are shared between callers; copy before mutating.
+text_cache = FileCache(_load_text)
+json_cache = FileCache(_load_json)
+
+
+def _substitute_lines(lines, placeholder, value):
+    """Replace one placeholder in a list of lines, indenting continuation lines."""
+    value_lines = str(value).split('\n')
+    new_lines = []
+    for line in lines:
+        if placeholder in line:
+            base_indent = line[:len(line) - len(line.lstrip())]
+            new_lines.append(line.replace(placeholder, value_lines[0]))
+            for value_line in value_lines[1:]:
+                if value_line.strip():
+                    new_lines.append(base_indent + value_line)
+                else:
+                    new_lines.append(value_line)  # Keep empty lines as-is
+        else:
+            new_lines.append(line)
+    return new_lines
+
+def expand_lines(lines, keys, mapping):
+    """Apply placeholders for keys one after another, in the given order."""
+    for key in keys:
+        placeholder = "[" + key + "]"
+        if any(placeholder in line for line in lines):
+            lines = _substitute_lines(lines, placeholder, mapping[key])
+    return lines
+
+
+class LineRenderer:
+    """
+    Applies a mapping to single template lines. Each line is expanded on its
+    own, so a template can be rendered whole or streamed line by line with
+    the same result.
+    """
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.keys = list(mapping)
+        self.order = {key: i for i, key in enumerate(self.keys)}
+        # Keys that cannot be recognized by PLACEHOLDER_RE need the full scan
+        self.full_scan = any('[' in key or ']' in key or '\n' in key for key in self.keys)
+
+        # A value that itself contains [other_key] must be expanded by the
+        # keys that follow it, so those lines fall back to an ordered scan.
+        self.chained = False
+        for value in mapping.values():
+            text = str(value)
+            if '[' in text and any(name in self.order for name in PLACEHOLDER_RE.findall(text)):
+                self.chained = True
+                break
+
+    def render(self, line, names=None):
+        """Expand one line (without its newline); names are its PLACEHOLDER_RE matches if known."""
+        if self.full_scan:
+            return '\n'.join(expand_lines([line], self.keys, self.mapping))
+        if names is None:
+            names = PLACEHOLDER_RE.findall(line) if '[' in line else ()
+        present = [name for name in names if name in self.order]
+        if not present:
+            return line
+        if self.chained:
+            line_keys = self.keys[min(self.order[name] for name in present):]
+        else:
+            line_keys = sorted(present, key=self.order.__getitem__)
+        return '\n'.join(expand_lines([line], line_keys, self.mapping))
+
+
+class TemplatePlan:
+    """
+    A template compiled into runs of literal lines and the individual lines
+    that contain [placeholder] candidates.
+
+    Rendering visits each placeholder line once and applies only the keys it
+    references, in map order, which gives the same output as substituting
+    every key over the whole template.
+    """
+    def __init__(self, template):
+        self.segments = []
+        literal = []
+        for line in template.split('\n'):
+            names = PLACEHOLDER_RE.findall(line)
+            if names:
+                if literal:
+                    self.segments.append(('\n'.join(literal), None))
+                    literal = []
+                self.segments.append((line, tuple(dict.fromkeys(names))))
+            else:
+                literal.append(line)
+        if literal or not self.segments:
+            self.segments.append(('\n'.join(literal), None))
+
+    def render(self, mapping):
+        renderer = LineRenderer(mapping)
+        out = []
+        for text, names in self.segments:
+            if names is None:
+                if renderer.full_scan:
+                    out.extend(renderer.render(line) for line in text.split('\n'))
+                else:
+                    out.append(text)
+            else:
+                out.append(renderer.render(text, names))
+        return '\n'.join(out)
+
+
+def render_file(source_path, destination_path, mapping, finish=None):
+    """
+    Render source_path into destination_path one line at a time, without
+    holding either file in memory. finish(text) post-processes each
+    rendered line.
+    """
+    renderer = LineRenderer(mapping)
+    with open(source_path) as source, open(destination_path, "w") as destination:
+        for line in source:
+            ending = '\n' if line.endswith('\n') else ''
+            text = renderer.render(line[:-1] if ending else line)
+            destination.write((finish(text) if finish else text) + ending)
+
+def render_head(source_path, mapping, max_bytes, finish=None):
+    """Rendered text of the first lines of source_path, up to about max_bytes; returns (text, truncated)."""
+    renderer = LineRenderer(mapping)
+    out = []
+    size = 0
+    with open(source_path) as source:
+        for line in source:
+            if size >= max_bytes:
+                return ''.join(out), True
+            ending = '\n' if line.endswith('\n') else ''
+            text = renderer.render(line[:-1] if ending else line)
+            text = (finish(text) if finish else text) + ending
+            out.append(text)
+            size += len(text)
+    return ''.join(out), False
+
+
+@lru_cache(maxsize=256)
+def compile_template(template):
+    """Return the cached TemplatePlan for a template string."""
+    return TemplatePlan(template)
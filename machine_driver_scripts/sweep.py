@@ -0,0 +1,155 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from machine_driver_scripts.engine import Engine, job_file_name
+from machine_driver_scripts.job_stage import JobStage
+
+# Threads rendering job directories of one sweep
+SWEEP_WORKERS = int(os.getenv("DRONA_SWEEP_WORKERS", "8"))
+
+
+def expand_grid(grid):
+    """Yield one {name: value} dict per combination of the grid's value lists, without building them all."""
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+def form_value(value):
+    """Form fields arrive as strings; grid values may be any JSON value."""
+    return value if isinstance(value, str) else json.dumps(value)
+
+def job_name(base_params, environment, index, overrides):
+    """Name of a sweep job: the combination's own name, else "<name>_<index>" with the sweep's name or environment."""
+    if "name" in overrides:
+        return form_value(overrides["name"])
+    base_name = (base_params.get("name") or "").strip() or environment
+    return f"{base_name}_{index}"
+
+def gen_drona_id():
+    return str(int(uuid.uuid4().int & 0xFFFFFFFFF))
+
+
+class SharedFiles:
+    """
+    Stores additional files whose content repeats across a sweep's jobs once,
+    as a read-only file in `directory`, and hardlinks it into each job.
+    Read-only means a shared input cannot be edited in one job and change in
+    every other; an editor that saves by replacing the file gives that job
+    its own copy. Job scripts are not shared, and a file is written normally
+    wherever linking fails.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._written = {}
+        self._lock = threading.Lock()
+        self.linked = 0
+
+    def _shared_copy(self, data):
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            source = self._written.get(digest)
+            if source is None:
+                os.makedirs(self.directory, exist_ok=True)
+                source = os.path.join(self.directory, digest)
+                with open(source, "wb") as f:
+                    f.write(data)
+                os.chmod(source, 0o444)
+                self._written[digest] = source
+            return source
+
+    def write(self, path, content):
+        data = content.encode()
+        try:
+            os.link(self._shared_copy(data), path)
+        except OSError:
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+        with self._lock:
+            self.linked += 1
+
+
+def _ordered_map(executor, function, iterable, window):
+    """Like executor.map, but only pulls `window` items ahead from a lazy iterable."""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(function, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_sweep(environment, env_dir, base_params, combinations, location, workers=None, shared=None):
+    """
+    Render one job directory per combination of parameter overrides.
+
+    Each job gets its own drona_job_id, is named "<name>_<index>" unless
+    the combination sets a name, and is written to <location>/<name>
+    through a JobStage. Additional files go through `shared` (by default a
+    SharedFiles in <location>/.shared); job scripts are written per job.
+    Results are yielded in combination order as dicts holding the job's
+    params (as submit_job_route would receive them) and generated paths,
+    or an "error" for combinations that failed to render.
+    """
+    workers = workers or SWEEP_WORKERS
+    shared = shared or SharedFiles(os.path.join(location, ".shared"))
+
+    def render(index, overrides):
+        params = dict(base_params)
+        params.update({key: form_value(value) for key, value in overrides.items()})
+        params["name"] = job_name(base_params, environment, index, overrides)
+        params["drona_job_id"] = gen_drona_id()
+        params["location"] = os.path.join(location, params["name"])
+
+        # Concurrency comes from the sweep, each engine evaluates its map sequentially
+        engine = Engine(map_workers=1)
+        engine.set_environment(environment, env_dir)
+        preview = engine.preview_script(params)
+
+        additional_files = {fname: file["content"] for fname, file in preview["additional_files"].items()}
+        scripts = {"run.sh": preview["driver"]}
+        bash_script = None
+        if "script" in preview:
+            bash_script = os.path.join(params["location"], job_file_name(params["name"]))
+            scripts[os.path.basename(bash_script)] = preview["script"]
+            params["run_command"] = preview["script"]
+        params["driver"] = preview["driver"]
+        params["additional_files"] = json.dumps(additional_files)
+
+        with JobStage(params["location"]) as stage:
+            streamed = [fname for fname in additional_files if fname in engine.streamed_files]
+            engine.write_streamed_files(params, stage.path, streamed)
+            for fname, content in additional_files.items():
+                if fname not in engine.streamed_files and fname not in scripts:
+                    shared.write(os.path.join(stage.path, fname), content)
+            # Scripts stay editable, so every job gets its own
+            for fname, content in scripts.items():
+                with open(os.path.join(stage.path, fname), "w") as f:
+                    f.write(content)
+
+        return {
+            "index": index,
+            "overrides": overrides,
+            "params": params,
+            "messages": preview["messages"],
+            "generated_files": {
+                "bash_script": bash_script,
+                "driver_script": os.path.join(params["location"], "run.sh")
+            }
+        }
+
+    def render_or_error(index, overrides):
+        try:
+            return render(index, overrides)
+        except Exception as e:
+            return {"index": index, "overrides": overrides, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from _ordered_map(executor, render_or_error, enumerate(combinations), workers * 2)
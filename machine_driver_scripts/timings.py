@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def _cache_hits(function):
+    """Hit counter of a drona_cache or functools.lru_cache wrapped function, else None."""
+    cache_info = getattr(function, "cache_info", None)
+    if cache_info is None:
+        return None
+    info = cache_info()
+    return info.get("hits") if isinstance(info, dict) else getattr(info, "hits", None)
+
+
+class Timings:
+    """
+    Wall time, call count, cache hits and result size of every utility
+    function and map key evaluated during one preview.
+    """
+    def __init__(self):
+        self.functions = {}
+        self.keys = {}
+        self._lock = threading.Lock()
+
+    def record_function(self, name, seconds, size, cached=None):
+        with self._lock:
+            entry = self.functions.setdefault(name, {"calls": 0, "ms": 0.0, "hits": 0, "misses": 0, "size": 0})
+            entry["calls"] += 1
+            entry["ms"] += seconds * 1e3
+            entry["size"] += size
+            if cached is True:
+                entry["hits"] += 1
+            elif cached is False:
+                entry["misses"] += 1
+
+    def record_key(self, key, seconds, size, cached):
+        with self._lock:
+            self.keys[key] = {"ms": seconds * 1e3, "size": size, "cached": cached}
+
+    def wrap(self, name, function):
+        """function, recording every call under name."""
+        def timed(*args):
+            hits = _cache_hits(function)
+            result = None
+            start = time.perf_counter()
+            try:
+                result = function(*args)
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                cached = None
+                if hits is not None:
+                    cached = _cache_hits(function) > hits
+                self.record_function(name, elapsed, len(str(result)) if result is not None else 0, cached)
+        return timed
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "functions": {name: dict(entry, ms=round(entry["ms"], 3)) for name, entry in self.functions.items()},
+                "keys": {key: dict(entry, ms=round(entry["ms"], 3)) for key, entry in self.keys.items()}
+            }
+
+
+class TimingStats:
+    """
+    Rolling per-environment statistics over the last `window` previews of
+    each function and map key, fed from every preview's Timings. Function
+    durations are per call, averaged within a preview.
+    """
+    def __init__(self, window=200, max_environments=32):
+        self._window = window
+        self._max_environments = max_environments
+        self._environments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, environment, timings):
+        with self._lock:
+            samples = self._environments.get(environment)
+            if samples is None:
+                samples = self._environments[environment] = {"functions": {}, "keys": {}}
+            self._environments.move_to_end(environment)
+            while len(self._environments) > self._max_environments:
+                self._environments.popitem(last=False)
+
+            for name, entry in timings.functions.items():
+                series = samples["functions"].setdefault(name, deque(maxlen=self._window))
+                series.append((entry["ms"] / entry["calls"], entry["calls"], entry["hits"], entry["misses"], entry["size"]))
+            for key, entry in timings.keys.items():
+                if not entry["cached"]:
+                    series = samples["keys"].setdefault(key, deque(maxlen=self._window))
+                    series.append((entry["ms"], 1, 0, 0, entry["size"]))
+
+    @staticmethod
+    def _summarize(series):
+        durations = sorted(sample[0] for sample in series)
+        calls = sum(sample[1] for sample in series)
+        return {
+            "samples": len(durations),
+            "calls": calls,
+            "mean_ms": round(sum(durations) / len(durations), 3),
+            "p50_ms": round(durations[len(durations) // 2], 3),
+            "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+            "max_ms": round(durations[-1], 3),
+            "hits": sum(sample[2] for sample in series),
+            "misses": sum(sample[3] for sample in series),
+            "mean_size": sum(sample[4] for sample in series) / max(calls, 1)
+        }
+
+    def summary(self):
+        with self._lock:
+            return {
+                environment: {
+                    group: {name: self._summarize(series) for name, series in samples[group].items()}
+                    for group in ("functions", "keys")
+                }
+                for environment, samples in self._environments.items()
+            }
+
+
+timing_stats = TimingStats()
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
 
 # Import and re-export all functions from the core module
-from .core import *
\ No newline at end of file
+from .core import *
+from .cache import *
+from .context import *
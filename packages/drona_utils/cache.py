@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+
+__all__ = ["drona_cache"]
+
+_MISSING = object()
+
+
+def _default_store_path():
+    """<drona_dir>/cache/drona_utils_cache.db, or None when drona_dir is not configured."""
+    config_file = Path("~/.drona/config.json").expanduser()
+    try:
+        with open(config_file, 'r') as f:
+            drona_dir = json.load(f).get("drona_dir")
+    except (OSError, ValueError, AttributeError):
+        return None
+    if not drona_dir:
+        return None
+    return Path(drona_dir).expanduser() / "cache" / "drona_utils_cache.db"
+
+
+class _DiskStore:
+    """SQLite table of JSON-encoded results, shared by every cached function."""
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=5)
+        if not self._ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key       TEXT NOT NULL,
+                    value     TEXT NOT NULL,
+                    expires   REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def get(self, namespace, key):
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                    (namespace, key)
+                ).fetchone()
+        except (sqlite3.Error, OSError):
+            return _MISSING, None
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return _MISSING, None
+        return json.loads(row[0]), row[1]
+
+    def set(self, namespace, key, value, expires):
+        try:
+            encoded = json.dumps(value)
+        except (TypeError, ValueError):
+            return  # Only JSON-serializable results are persisted
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                    (namespace, key, encoded, expires)
+                )
+                conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+                conn.commit()
+        except (sqlite3.Error, OSError):
+            pass
+
+    def clear(self, namespace):
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+                conn.commit()
+        except (sqlite3.Error, OSError):
+            pass
+
+
+def _namespace(function):
+    """Function identity plus a hash of its code, so editing the function invalidates stored results."""
+    code = function.__code__
+    digest = hashlib.sha1(code.co_code + repr(code.co_consts).encode()).hexdigest()[:16]
+    return f"{function.__module__}.{function.__qualname__}:{digest}"
+
+def _make_key(args, kwargs):
+    return json.dumps([args, kwargs], sort_keys=True, default=repr)
+
+
+def drona_cache(function=None, ttl=None, maxsize=128, persist=False):
+    """
+    Memoize a utility function by its arguments.
+
+    Args:
+        ttl: Seconds a result stays valid; None keeps it until evicted
+        maxsize: Results kept in memory, least recently used are evicted first
+        persist: Also store results in <drona_dir>/cache so they survive app restarts
+
+    Example:
+        from drona_utils import drona_cache
+
+        @drona_cache(ttl=600, persist=True)
+        def available_versions(module_name):
+            ...
+
+    Results are reused instead of calling the function again, so do not cache
+    functions that call drona_add_* helpers.
+    """
+    def decorator(func):
+        namespace = _namespace(func)
+        entries = OrderedDict()
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0}
+        store = None
+        if persist:
+            store_path = _default_store_path()
+            store = _DiskStore(store_path) if store_path else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            now = time.time()
+
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return entry[0]
+
+            if store is not None:
+                value, expires = store.get(namespace, key)
+                if value is not _MISSING:
+                    with lock:
+                        entries[key] = (value, expires)
+                        entries.move_to_end(key)
+                        while len(entries) > maxsize:
+                            entries.popitem(last=False)
+                        stats["hits"] += 1
+                    return value
+
+            value = func(*args, **kwargs)
+            expires = now + ttl if ttl is not None else None
+
+            with lock:
+                stats["misses"] += 1
+                entries[key] = (value, expires)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            if store is not None:
+                store.set(namespace, key, value, expires)
+            return value
+
+        def cache_info():
+            with lock:
+                return {"hits": stats["hits"], "misses": stats["misses"],
+                        "size": len(entries), "maxsize": maxsize, "ttl": ttl,
+                        "persist": store is not None}
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+            if store is not None:
+                store.clear(namespace)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    if callable(function):
+        return decorator(function)
+    return decorator
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+__all__ = ["drona_preview_env"]
+
+# Set in the environment of subprocesses started with drona_preview_env()
+CONTEXT_FILE_ENV = "DRONA_PREVIEW_CONTEXT_FILE"
+
+_current = contextvars.ContextVar("drona_preview_context", default=None)
+
+
+def legacy_paths():
+    """Per-user files used when drona_add_* runs outside of any preview context."""
+    user_id = os.getenv('USER')
+    return {
+        "messages": os.path.join("/tmp", f"{user_id}.messages"),
+        "mappings": os.path.join("/tmp", f"{user_id}.map"),
+        "additional_files": os.path.join("/tmp", f"{user_id}.additional_files"),
+    }
+
+
+def read_legacy_file(path):
+    """(signature, data) of a per-user legacy file, or None when it is missing or unreadable."""
+    try:
+        st = os.stat(path)
+        with open(path, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size), data
+
+
+def legacy_entries(kind, data, before):
+    """Records of a legacy file's data that were not in it yet (before) when the preview started."""
+    if kind == "messages":
+        old = len(before.get("messages", [])) if before else 0
+        return [{"kind": "message", **message} for message in data.get("messages", [])[old:]]
+    if kind == "mappings":
+        return [{"kind": "mapping", "key": key, "value": value} for key, value in data.items()
+                if not before or before.get(key) != value]
+    old = len(before) if before else 0
+    return [{"kind": "additional_file", **additional_file} for additional_file in data[old:]]
+
+
+class PreviewContext:
+    """
+    Messages, dynamic mappings and additional files reported by utility
+    functions during one preview.
+
+    The engine activates a context around map evaluation and the drona_add_*
+    helpers write into it directly. Subprocesses cannot see the context, so
+    they append JSON lines to a per-request spool file instead, which
+    collect() merges back in.
+
+    Subprocesses not started with drona_preview_env() still write the
+    per-user /tmp files, as before. collect() reads and removes those that
+    changed since the context was created, merging only the entries added
+    since then; files left untouched during the preview are not read.
+    """
+    def __init__(self):
+        self.messages = []
+        self.mappings = {}
+        self.additional_files = []
+        self.spool_path = None
+        self._legacy_before = {kind: read_legacy_file(path) for kind, path in legacy_paths().items()}
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            kind = record["kind"]
+            if kind == "message":
+                self.messages.append({"type": record["type"], "text": record["text"]})
+            elif kind == "mapping":
+                self.mappings[record["key"]] = record["value"]
+            elif kind == "additional_file":
+                self.additional_files.append({
+                    "file_name": record["file_name"],
+                    "preview_name": record["preview_name"],
+                    "preview_order": record["preview_order"]
+                })
+
+    def subprocess_env(self):
+        """A copy of os.environ that points drona_add_* in a child process at this context."""
+        with self._lock:
+            if self.spool_path is None:
+                fd, self.spool_path = tempfile.mkstemp(prefix="drona_preview_", suffix=".jsonl")
+                os.close(fd)
+        env = dict(os.environ)
+        env[CONTEXT_FILE_ENV] = self.spool_path
+        return env
+
+    def collect(self):
+        """Merge records written by subprocesses, from the spool file and the legacy /tmp files."""
+        if self.spool_path is not None:
+            with self._lock:
+                with open(self.spool_path, 'r+') as spool:
+                    lines = spool.readlines()
+                    spool.truncate(0)
+            for line in lines:
+                if line.strip():
+                    self.add(json.loads(line))
+
+        for kind, path in legacy_paths().items():
+            current = read_legacy_file(path)
+            if current is None:
+                continue
+            with self._lock:
+                before = self._legacy_before.get(kind)
+                if before is not None and before[0] == current[0]:
+                    continue  # Not written during this preview
+                self._legacy_before[kind] = None
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            for entry in legacy_entries(kind, current[1], before[1] if before else None):
+                self.add(entry)
+
+    def close(self):
+        if self.spool_path is not None:
+            try:
+                os.remove(self.spool_path)
+            except OSError:
+                pass
+            self.spool_path = None
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+def current_context():
+    return _current.get()
+
+
+def record(entry):
+    """Deliver one drona_add_* record to the active preview context."""
+    context = current_context()
+    if context is not None:
+        context.add(entry)
+        return True
+
+    spool_path = os.getenv(CONTEXT_FILE_ENV)
+    if spool_path:
+        with open(spool_path, 'a') as spool:
+            spool.write(json.dumps(entry) + "\n")
+        return True
+    return False
+
+
+def drona_preview_env():
+    """
+    Environment for subprocesses that call drona_add_* helpers, e.g.
+    subprocess.run([...], env=drona_preview_env()). Outside a preview this is
+    a copy of os.environ.
+    """
+    context = current_context()
+    if context is None:
+        return dict(os.environ)
+    return context.subprocess_env()
@@ -3,8 +3,15 @@
 import os
 import json
 
+# Private alias keeps it out of `from drona_utils import *`
+from .context import record as _record
+
 
 def drona_add_additional_file(additional_file, preview_name = "", preview_order = 0):
+    if _record({"kind": "additional_file", "file_name": additional_file,
+                "preview_name": preview_name, "preview_order": preview_order}):
+        return
+
     user_id = os.getenv('USER')
 
     additional_files_path = os.path.join("/tmp", f"{user_id}.additional_files")
@@ -34,6 +41,9 @@ def drona_add_note(note):
     drona_add_message(note, "note")
     
 def drona_add_message(msg_text, msg_type):
+    if _record({"kind": "message", "type": msg_type, "text": msg_text}):
+        return
+
     user_id = os.getenv('USER')
     
     msg_path = os.path.join("/tmp", f"{user_id}.messages")
@@ -48,6 +58,9 @@ def drona_add_message(msg_text, msg_type):
         json.dump(messages, file)
 
 def drona_add_mapping(key, evaluation_str):
+    if _record({"kind": "mapping", "key": key, "value": evaluation_str}):
+        return
+
     user_id = os.getenv('USER')
 
     mappings_path = os.path.join("/tmp", f"{user_id}.map")
@@ -264,34 +264,42 @@ export function App() {
     setGlobalFiles(combinedFiles);
   }
 
-  function preview_job(action, formData, callback) {
-    var request = new XMLHttpRequest();
-
-    request.responseType = "json";
+  // Streams /preview/stream: onEvent receives every NDJSON event as it arrives
+  async function preview_job_stream(action, formData, onEvent, callback) {
     formData.append("env_dir", environment.src);
     formData.append("env_name", environment.env);
 
-    request.open("POST", action, true);
-
-    request.onload = function (event) {
-      if (request.status == 200) {
-        var jobScript = request.response;
-        callback(null, jobScript); // Pass the result to the callback
-      } else {
-        callback(`Error ${request.status}. Try again!`); // Pass the error to the callback
+    try {
+      const response = await fetch(action, { method: "POST", body: formData });
+      if (!response.ok) {
+        callback(`Error ${response.status}. Try again!`);
+        return;
       }
-    };
-    request.onerror = function (event) {
-      callback("An error has occurred. Please try again!"); // Pass the error to the callback
-    };
-
-    request.send(formData);
-    // console.log("FormData2: ")
-
-    // for (const [key, value] of formData.entries()) {
-    //   console.log(key, value);
-    // }
 
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffered.split("\n");
+        buffered = lines.pop();
+        for (const line of lines) {
+          if (line.trim()) {
+            const event = JSON.parse(line);
+            if (event.type === "error") {
+              callback(event.message);
+              return;
+            }
+            onEvent(event);
+          }
+        }
+        if (done) break;
+      }
+      callback(null);
+    } catch (error) {
+      callback("An error has occurred. Please try again!");
+    }
   }
 
   const handleAddEnvironment = (newEnv) => {
@@ -334,61 +342,88 @@ export function App() {
       return;
     }
 
-    const action = document.dashboard_url + "/jobs/composer/preview";
+    const action = document.dashboard_url + "/jobs/composer/preview/stream";
 
     console.log("FormData: ")
     for (const [key, value] of formData.entries()) {
       console.log(key, value);
     }
 
-    preview_job(action, formData, function (error, jobScript) {
+    // Panes are shown as soon as the driver arrives and updated as the other files finish
+    const jobScript = { additional_files: {}, messages: [] };
+
+    function showPreview() {
+      setJobScript(jobScript["script"]);
+
+      const panes = [
+        {
+          preview_name: "driver.sh",
+          content: jobScript["driver"],
+          name: "driver",
+          order: -2
+        },
+
+      ];
+      if (jobScript["script"] != null) {
+        panes.push({
+          preview_name: "template.txt",
+          content: jobScript["script"],
+          name: "run_command",
+          order: -3
+        });
+      }
+
+      for (const [fname, file] of Object.entries(jobScript["additional_files"])) {
+        panes.push({
+          preview_name: file["preview_name"],
+          content: file["content"],
+          name: fname,
+          order: file["preview_order"]
+        });
+      }
+
+      setPanes(panes);
+      setMessages(jobScript["messages"]);
+    }
+
+    function handlePreviewEvent(event) {
+      switch (event.type) {
+        case "job":
+          // Capture drona_job_id from preview if provided
+          setDronaJobId(event["drona_job_id"] || null);
+
+          // Sync run location to the effective location used in preview,
+          // so submit sees the same directory (including drona_job_id)
+          if (event["location"]) {
+            setRunLocation(event["location"]);
+          }
+          return;
+        case "messages":
+          jobScript["messages"] = event["content"];
+          return;
+        case "driver":
+        case "script":
+          jobScript[event.type] = event["content"];
+          break;
+        case "additional_file":
+          jobScript["additional_files"][event["name"]] = event["file"];
+          break;
+        default:
+          return;
+      }
+      if (jobScript["driver"] != null) {
+        showPreview();
+      }
+    }
+
+    preview_job_stream(action, formData, handlePreviewEvent, function (error) {
       if (error) {
         alert(error);
         if (window.jQuery) {
           window.jQuery(previewRef.current).modal('hide');
         }
       } else {
-
-        // Capture drona_job_id from preview if provided
-        setDronaJobId(jobScript["drona_job_id"] || null);
-
-        // Sync run location to the effective location used in preview,
-        // so submit sees the same directory (including drona_job_id)
-        if (jobScript["location"]) {
-          setRunLocation(jobScript["location"]);
-        }
-
-        setJobScript(jobScript["script"]);
-
-        const panes = [
-          {
-            preview_name: "driver.sh",
-            content: jobScript["driver"],
-            name: "driver",
-            order: -2
-          },
-
-        ];
-        if (jobScript["script"] != null) {
-          panes.push({
-            preview_name: "template.txt",
-            content: jobScript["script"],
-            name: "run_command",
-            order: -3
-          });
-        }
-
-        for (const [fname, file] of Object.entries(jobScript["additional_files"])) {
-          panes.push({
-            preview_name: file["preview_name"],
-            content: file["content"],
-            name: fname,
-            order: file["preview_order"]
-          });
-        }
-
-        setPanes(panes);
-        setMessages(jobScript["messages"]);
+        showPreview();
       }
     });
 
@@ -41,6 +41,7 @@ import { executeScript } from '../utils/utils';
  * @param {boolean} [options.isShown=true] - Component visibility
  * @param {boolean} [options.fetchOnMount=true] - Auto-fetch when shown
  * @param {number} [options.debounceMs=300] - Debounce delay in milliseconds
+ * @param {Object} [options.retrieverOptions] - The element's retrieverOptions from the schema
  * @param {Function} [options.onError] - Error callback
  * @param {Function} [options.onSuccess] - Success callback
  * @returns {Object} Hook state and methods
@@ -53,6 +54,7 @@ export function useRetriever({
   isShown = true,
   fetchOnMount = true,
   debounceMs = 300,
+  retrieverOptions = null,
   onError,
   onSuccess,
 }) {
@@ -138,6 +140,7 @@ export function useRetriever({
         formValues: formValuesRef.current,
         parseJSON,
         environment: environmentRef.current,
+        retrieverOptions,
         onError: (err) => {
           if (isMountedRef.current) {
             setError(err);
@@ -161,7 +164,7 @@ export function useRetriever({
         setIsLoading(false);
       }
     }
-  }, [retrieverPath, parseJSON]); // Only depend on stable primitives
+  }, [retrieverPath, parseJSON, retrieverOptions]); // Only depend on stable values
 
   // Debounced fetch function
   const debouncedFetch = useCallback(() => {
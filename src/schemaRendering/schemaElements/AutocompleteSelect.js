@@ -91,14 +91,17 @@ function AutocompleteSelect(props) {
         formValues: {},
 	environment: environment,
         parseJSON: true,
+        requestKey: props.name,
+        retrieverOptions: props.retrieverOptions,
         onError: props.setError
       });
 
       setOptions(data);
+      setIsLoading(false);
     } catch (err) {
+      if (err.superseded) return;
       console.error("Search error:", err);
       setError(err.message || "Search failed");
-    } finally {
       setIsLoading(false);
     }
   };
@@ -96,14 +96,20 @@ function DynamicCheckboxGroup(props) {
                 formValues: formValuesRef.current,
                 parseJSON: true,
 		environment: environment,
+                batch: props.retrieverBatch,
+                prefetched: props.retrieverPrefetchResult,
+                requestKey: props.name,
+                retrieverOptions: props.retrieverOptions,
                 onError: props.setError
             });
 
             setOptions(Array.isArray(data) ? data : []);
             setIsEvaluated(true);
+            setIsLoading(false);
         } catch (error) {
+            // A newer request for this element owns the loading state now
+            if (error.superseded) return;
             setIsEvaluated(true); // show empty state
-        } finally {
             setIsLoading(false);
         }
     }, [props.retrieverPath, props.retriever, props.retrieverParams, props.setError]);
@@ -114,14 +114,20 @@ function DynamicSelect(props) {
         formValues: formValuesRef.current,
         parseJSON: true,
 	environment: environment,
+        batch: props.retrieverBatch,
+        prefetched: props.retrieverPrefetchResult,
+        requestKey: props.name,
+        retrieverOptions: props.retrieverOptions,
         onError: props.setError
       });
 
       setOptions(data);
       setIsEvaluated(true);
+      setIsLoading(false);
     } catch (error) {
+      // A newer request for this element owns the loading state now
+      if (error.superseded) return;
       // Error already handled by executeScript
-    } finally {
       setIsLoading(false);
     }
   }, [props.retrieverPath, props.retriever, props.retrieverParams, props.setError]);
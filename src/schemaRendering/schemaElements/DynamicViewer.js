@@ -148,6 +148,7 @@ function DynamicViewer(props) {
     parseJSON: true,
     isShown: props.isShown !== false,
     fetchOnMount: !!retrieverPath,
+    retrieverOptions: props.retrieverOptions,
     onError: props.setError,
   });
 
@@ -56,6 +56,7 @@ function Hidden(props) {
     parseJSON: false, // Hidden typically returns raw text
     isShown: true, // Always shown (it's hidden but active)
     fetchOnMount: !!retrieverPath,
+    retrieverOptions: props.retrieverOptions,
     onError: props.setError,
   });
 
@@ -49,6 +49,7 @@
  * @property {boolean} [allowHtml=false] - Whether to render content as HTML using dangerouslySetInnerHTML
  * @property {boolean} [showRefreshButton=false] - Whether to show a manual refresh button for dynamic content
  * @property {number} [refreshInterval] - Auto-refresh interval in seconds
+ * @property {boolean} [retrieverStream=false] - Whether to show the script's output while it is still running
  * @property {boolean} [isHeading=false] - Whether to style the text as a heading with larger, bold font
  * @property {function} [setError] - Function to handle errors during content fetching
  */
@@ -57,10 +58,12 @@ import React, { useState, useEffect, useRef, useContext, useCallback, useMemo }
 import FormElementWrapper from "../utils/FormElementWrapper";
 import { FormValuesContext } from "../FormValuesContext";
 import { getFieldValue } from "../utils/fieldUtils";
-import { executeScript } from "../utils/utils";
+import { executeScript, streamScript } from "../utils/utils";
 
 function StaticText(props) {
   const [content, setContent] = useState(props.value || "");
+  // Output of a streamed retriever that has not finished yet; shown but not stored as the field value
+  const [partialContent, setPartialContent] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const refreshTimerRef = useRef(null);
@@ -90,6 +93,8 @@ function StaticText(props) {
       .map(value => value.substring(1));
   }, [props.retrieverParams]);
 
+  const shownContent = partialContent ?? content;
+
   const createMarkup = (html) => {
     return { __html: html };
   };
@@ -101,23 +106,31 @@ function StaticText(props) {
     setError(null);
 
     try {
-      const data = await executeScript({
+      const options = {
         retrieverPath: props.retrieverPath,
         retrieverParams: props.retrieverParams,
         formValues: formValuesRef.current,
 	environment: environment,
-        parseJSON: false,
+        prefetched: props.retrieverPrefetchResult,
+        requestKey: props.name,
+        retrieverOptions: props.retrieverOptions,
         onError: props.setError
-      });
+      };
+      const data = props.retrieverStream
+        ? await streamScript({ ...options, onOutput: setPartialContent })
+        : await executeScript({ ...options, parseJSON: false });
 
       setContent(data);
+      setPartialContent(null);
+      setIsLoading(false);
     } catch (err) {
+      if (err.superseded) return;
+      setPartialContent(null);
       console.error("Error fetching content:", err);
       setError(err.message || "Failed to load content");
-    } finally {
       setIsLoading(false);
     }
-  }, [props.isDynamic, props.retrieverPath, props.retrieverParams, props.setError]);
+  }, [props.isDynamic, props.retrieverPath, props.retrieverParams, props.retrieverStream, props.setError]);
 
   const debouncedFetchContent = useCallback(
     (() => {
@@ -230,11 +243,11 @@ function StaticText(props) {
         {props.allowHtml ? (
           <div
             className={`${props.isHeading ? 'text-xl font-bold' : ''}`}
-            dangerouslySetInnerHTML={createMarkup(content)}
+            dangerouslySetInnerHTML={createMarkup(shownContent)}
           />
         ) : (
           <span className={`${props.isHeading ? 'text-xl font-bold' : ''}`} style={{ whiteSpace: 'pre-line' }}>
-            {content}
+            {shownContent}
           </span>
         )}
 
@@ -1,38 +1,19 @@
 import { getFieldValue, getAllFields } from './fieldUtils';
 import config from '@config';
 
+function dashboardUrl() {
+    const devUrl = config.development.dashboard_url;
+    const prodUrl = config.production.dashboard_url;
+    return process.env.NODE_ENV === "development" ? devUrl : prodUrl;
+}
+
 /**
- * Execute a retriever script with dynamic parameters from form values
- * @param {Object} options - Configuration object
- * @param {string} options.retrieverPath - Path to the retriever script (required)
- * @param {Object} [options.retrieverParams={}] - Parameters to pass (supports $fieldName references)
- * @param {Object} [options.formValues={}] - Current form values for resolving $fieldName
- * @param {boolean} [options.parseJSON=false] - Whether to parse response as JSON
- * @param {Function} [options.onError] - Error callback
- * @returns {Promise<any>} Script result
+ * Query parameters of a retriever call: environment context plus retrieverParams
+ * with $fieldName references resolved against formValues
  */
-export async function executeScript({
-    retrieverPath,
-    retrieverParams = {},
-    formValues = {},
-    parseJSON = false,
-    environment = null,
-    onError = null
-}) {
-    if (!retrieverPath) {
-        const error = {
-            message: "Retriever path is not set",
-            status_code: 400,
-            details: ""
-        };
-        onError?.(error);
-        throw error;
-    }
-
+function buildRetrieverParams(retrieverParams, formValues, environment) {
     const params = new URLSearchParams();
 
-    
-
     if (environment && environment.env && environment.src) {
         const envPath = `${environment.src}/${environment.env}`;
         params.append('DRONA_ENV_DIR', envPath);
@@ -54,12 +35,140 @@ export async function executeScript({
         });
     }
 
-    const queryString = params.toString();
-    const devUrl = config.development.dashboard_url;
-    const prodUrl = config.production.dashboard_url;
-    const curUrl = process.env.NODE_ENV === "development" ? devUrl : prodUrl;
-    
-    const requestUrl = `${curUrl}/jobs/composer/evaluate_script?retriever_path=${encodeURIComponent(
+    return params;
+}
+
+function parseRetrieverOutput(text, parseJSON) {
+    if (parseJSON) {
+        return JSON.parse(text);
+    }
+    try {
+        return JSON.parse(text);
+    } catch {
+        return text;
+    }
+}
+
+// Distinguishes this tab's request keys from other tabs' on the server
+const pageSessionId = Math.random().toString(36).slice(2, 10);
+
+/**
+ * Error for a call the server stopped because a newer call with the same requestKey arrived;
+ * callers can ignore it since the newer call delivers the result
+ */
+function supersededError(details) {
+    return { message: "Superseded by a newer request", status_code: 409, details, superseded: true };
+}
+
+// Results the /schema response embedded (retrieverPrefetchResult) that were already handed out
+const usedPrefetches = new WeakSet();
+
+// Calls made within this many milliseconds of each other share one /evaluate_scripts request
+const BATCH_WINDOW_MS = 10;
+let pendingBatch = [];
+let batchTimer = null;
+let batchCallId = 0;
+
+async function flushRetrieverBatch() {
+    const calls = pendingBatch;
+    pendingBatch = [];
+    batchTimer = null;
+
+    if (calls.length === 1) {
+        const call = calls[0];
+        fetchRetriever(call.retrieverPath, call.params, call.parseJSON, call.onError, call.requestKey,
+                       call.retrieverOptions).then(call.resolve, call.reject);
+        return;
+    }
+
+    const byId = new Map(calls.map(call => [call.id, call]));
+    const fail = (call, error) => {
+        call.onError?.(error);
+        call.reject(error);
+    };
+
+    try {
+        const response = await fetch(`${dashboardUrl()}/jobs/composer/evaluate_scripts`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                calls: calls.map(call => ({
+                    id: call.id,
+                    retriever_path: call.retrieverPath,
+                    params: Object.fromEntries(call.params),
+                    ...(call.requestKey ? { request_key: call.requestKey } : {}),
+                    ...call.retrieverOptions
+                }))
+            })
+        });
+
+        if (!response.ok || !response.body) {
+            let errorData = {};
+            try {
+                errorData = await response.json();
+            } catch {}
+            throw {
+                message: errorData.message || "Failed to execute scripts",
+                status_code: response.status,
+                details: errorData.details || errorData
+            };
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const event = JSON.parse(line);
+            const call = byId.get(event.id);
+            if (!call) return;
+            byId.delete(event.id);
+            if (event.error && event.details?.superseded) {
+                call.reject(supersededError(event.details));
+                return;
+            }
+            if (event.error) {
+                fail(call, {
+                    message: event.message || "Failed to execute script",
+                    status_code: event.status_code,
+                    details: event.details
+                });
+                return;
+            }
+            try {
+                call.resolve(parseRetrieverOutput(event.result, call.parseJSON));
+            } catch (error) {
+                fail(call, { message: "Invalid JSON returned by script", status_code: 400, details: String(error) });
+            }
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered);
+
+        byId.forEach(call => fail(call, { message: "No result returned for script", status_code: 500, details: "" }));
+    } catch (error) {
+        const apiError = error && error.status_code !== undefined
+            ? error
+            : { message: error?.message || "Failed to execute scripts", status_code: 500, details: "" };
+        byId.forEach(call => fail(call, apiError));
+    }
+}
+
+async function fetchRetriever(retrieverPath, params, parseJSON, onError, requestKey = null, retrieverOptions = null) {
+    const query = new URLSearchParams(params);
+    if (requestKey) {
+        query.append('request_key', requestKey);
+    }
+    Object.entries(retrieverOptions || {}).forEach(([option, value]) => query.append(option, value));
+    const queryString = query.toString();
+    const requestUrl = `${dashboardUrl()}/jobs/composer/evaluate_script?retriever_path=${encodeURIComponent(
         retrieverPath
     )}${queryString ? `&${queryString}` : ""}`;
 
@@ -70,6 +179,10 @@ export async function executeScript({
         try {
             errorData = await response.json();
         } catch {}
+
+        if (response.status === 409 && errorData.details?.superseded) {
+            throw supersededError(errorData.details);
+        }
         
         const error = {
             message: errorData.message || "Failed to execute script",
@@ -84,12 +197,182 @@ export async function executeScript({
         return await response.json();
     } else {
         const text = await response.text();
+        return parseRetrieverOutput(text, false);
+    }
+}
+
+/**
+ * Execute a retriever script with dynamic parameters from form values
+ * @param {Object} options - Configuration object
+ * @param {string} options.retrieverPath - Path to the retriever script (required)
+ * @param {Object} [options.retrieverParams={}] - Parameters to pass (supports $fieldName references)
+ * @param {Object} [options.formValues={}] - Current form values for resolving $fieldName
+ * @param {boolean} [options.parseJSON=false] - Whether to parse response as JSON
+ * @param {boolean} [options.batch=false] - Group with other calls made at the same time into one request
+ *   (set from the schema's retrieverBatch)
+ * @param {Object} [options.prefetched] - The element's retrieverPrefetchResult; answers the first call
+ *   without a request
+ * @param {string} [options.requestKey] - Identifies the calling element; a newer call with the same key
+ *   stops this one on the server, which then rejects with an error whose `superseded` is true
+ * @param {Object} [options.retrieverOptions] - The element's retrieverOptions from the schema, such as
+ *   its cache TTL; sent along with the call
+ * @param {Function} [options.onError] - Error callback
+ * @returns {Promise<any>} Script result
+ */
+export async function executeScript({
+    retrieverPath,
+    retrieverParams = {},
+    formValues = {},
+    parseJSON = false,
+    environment = null,
+    batch = false,
+    prefetched = null,
+    requestKey = null,
+    retrieverOptions = null,
+    onError = null
+}) {
+    if (!retrieverPath) {
+        const error = {
+            message: "Retriever path is not set",
+            status_code: 400,
+            details: ""
+        };
+        onError?.(error);
+        throw error;
+    }
+
+    if (prefetched && typeof prefetched === 'object' && !usedPrefetches.has(prefetched)) {
+        usedPrefetches.add(prefetched);
         try {
-            return JSON.parse(text);
+            return parseRetrieverOutput(prefetched.output, parseJSON);
         } catch {
-            return text;
+            // Fall through to a regular request
+        }
+    }
+
+    const params = buildRetrieverParams(retrieverParams, formValues, environment);
+    const sessionKey = requestKey ? `${pageSessionId}:${requestKey}` : null;
+
+    if (!batch) {
+        return fetchRetriever(retrieverPath, params, parseJSON, onError, sessionKey, retrieverOptions);
+    }
+
+    return new Promise((resolve, reject) => {
+        pendingBatch.push({
+            id: String(++batchCallId), retrieverPath, params, parseJSON, onError,
+            requestKey: sessionKey, retrieverOptions, resolve, reject
+        });
+        if (!batchTimer) {
+            batchTimer = setTimeout(flushRetrieverBatch, BATCH_WINDOW_MS);
+        }
+    });
+}
+
+/**
+ * Execute a text retriever script, receiving its output while it runs
+ * @param {Object} options - Configuration object, as for executeScript
+ * @param {string} options.retrieverPath - Path to the retriever script (required)
+ * @param {Object} [options.retrieverParams={}] - Parameters to pass (supports $fieldName references)
+ * @param {Object} [options.formValues={}] - Current form values for resolving $fieldName
+ * @param {Object} [options.prefetched] - The element's retrieverPrefetchResult; answers the first call
+ *   without a request
+ * @param {string} [options.requestKey] - Identifies the calling element, as for executeScript
+ * @param {Function} [options.onOutput] - Called with the output received so far each time more arrives
+ * @param {Function} [options.onError] - Error callback
+ * @returns {Promise<*>} The complete script output, parsed as by executeScript with parseJSON false
+ */
+export async function streamScript({
+    retrieverPath,
+    retrieverParams = {},
+    formValues = {},
+    environment = null,
+    prefetched = null,
+    requestKey = null,
+    onOutput = null,
+    onError = null
+}) {
+    if (!retrieverPath) {
+        const error = {
+            message: "Retriever path is not set",
+            status_code: 400,
+            details: ""
+        };
+        onError?.(error);
+        throw error;
+    }
+
+    if (prefetched && typeof prefetched === 'object' && !usedPrefetches.has(prefetched)) {
+        usedPrefetches.add(prefetched);
+        return parseRetrieverOutput(prefetched.output, false);
+    }
+
+    const query = buildRetrieverParams(retrieverParams, formValues, environment);
+    if (requestKey) {
+        query.append('request_key', `${pageSessionId}:${requestKey}`);
+    }
+    const requestUrl = `${dashboardUrl()}/jobs/composer/evaluate_dynamic_text_stream?retriever_path=${encodeURIComponent(
+        retrieverPath
+    )}&${query.toString()}`;
+
+    const fail = (error) => {
+        onError?.(error);
+        throw error;
+    };
+
+    const response = await fetch(requestUrl);
+
+    if (!response.ok || !response.body) {
+        let errorData = {};
+        try {
+            errorData = await response.json();
+        } catch {}
+        fail({
+            message: errorData.message || "Failed to execute script",
+            status_code: response.status,
+            details: errorData.details || errorData
+        });
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let output = '';
+    let finished = false;
+    const handleLine = (line) => {
+        if (!line.trim()) return;
+        const event = JSON.parse(line);
+        if (event.error && event.details?.superseded) {
+            throw supersededError(event.details);
+        }
+        if (event.error) {
+            fail({
+                message: event.message || "Failed to execute script",
+                status_code: event.status_code,
+                details: event.details
+            });
         }
+        if (event.done) {
+            finished = true;
+            return;
+        }
+        output += event.output;
+        onOutput?.(output);
+    };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.forEach(handleLine);
     }
+    handleLine(buffered);
+
+    if (!finished) {
+        fail({ message: "Script output ended unexpectedly", status_code: 500, details: "" });
+    }
+    return parseRetrieverOutput(output, false);
 }
 
 /**
@@ -108,11 +391,7 @@ export async function fetchFileContent({ filePath, environment }) {
         params.append('DRONA_ENV_DIR', envPath);
     }
 
-    const devUrl = config.development.dashboard_url;
-    const prodUrl = config.production.dashboard_url;
-    const curUrl = process.env.NODE_ENV === "development" ? devUrl : prodUrl;
-
-    const requestUrl = `${curUrl}/jobs/composer/read_file?${params.toString()}`;
+    const requestUrl = `${dashboardUrl()}/jobs/composer/read_file?${params.toString()}`;
     const response = await fetch(requestUrl);
 
     if (!response.ok) {
@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from machine_driver_scripts.engine import Engine, STREAM_THRESHOLD, environment_pool
+
+UTILS = '''
+def add_inputs(name):
+    drona_add_additional_file("big.txt", "Big input", 1)
+    drona_add_additional_file("blob.bin", "Binary input", 2)
+    return name
+'''
+
+
+def make_environment(root):
+    env_path = os.path.join(root, "dyn")
+    os.makedirs(env_path)
+    with open(os.path.join(env_path, "map.json"), "w") as f:
+        json.dump({"INPUTS": "!add_inputs($name)"}, f)
+    with open(os.path.join(env_path, "utils.py"), "w") as f:
+        f.write(UTILS)
+    with open(os.path.join(env_path, "schema.json"), "w") as f:
+        json.dump({"name": {"type": "text", "label": "Name"}}, f)
+    with open(os.path.join(env_path, "driver.sh"), "w") as f:
+        f.write("#!/bin/bash\necho [INPUTS]\n")
+
+    line = "input [INPUTS] " + "x" * 80 + "\n"
+    with open(os.path.join(env_path, "big.txt"), "w") as f:
+        f.write(line * (STREAM_THRESHOLD * 2 // len(line)))
+    with open(os.path.join(env_path, "blob.bin"), "wb") as f:
+        f.write(bytes(range(256)) * 64)
+    return env_path
+
+
+def test_submit_writes_large_and_binary_dynamic_files_from_source(tmp_path):
+    env_path = make_environment(str(tmp_path))
+    location = tmp_path / "job"
+    location.mkdir()
+    params = {"name": "job1", "location": str(location), "runtime": "dyn", "env_dir": str(tmp_path)}
+
+    environment_pool.clear()
+    preview = Engine()
+    preview.set_environment("dyn", str(tmp_path))
+    previewed = preview.preview_script(dict(params))
+    assert previewed["additional_files"]["big.txt"]["streamed"]
+    assert previewed["additional_files"]["blob.bin"]["streamed"]
+
+    # The client sends back the preview text, which is truncated for streamed files
+    submitted = {name: file["content"] for name, file in previewed["additional_files"].items()}
+    submit = Engine()
+    submit.set_environment("dyn", str(tmp_path))
+    submit.generate_script(dict(params, additional_files=json.dumps(submitted)))
+
+    with open(os.path.join(env_path, "big.txt")) as f:
+        expected = f.read().replace("[INPUTS]", "job1")
+    with open(location / "big.txt") as f:
+        written = f.read()
+    assert len(written) == len(expected) > STREAM_THRESHOLD
+    assert written == expected
+    with open(os.path.join(env_path, "blob.bin"), "rb") as source, open(location / "blob.bin", "rb") as copy:
+        assert copy.read() == source.read()
+
+
+COUNTING_UTILS = '''
+import os
+
+def add_inputs(name):
+    with open(os.path.join(os.path.dirname(__file__), "calls"), "a") as f:
+        f.write(name + "\\n")
+    if name != "static":
+        drona_add_additional_file("blob.bin", "Binary input", 2)
+    return name
+'''
+
+
+def make_counting_environment(root):
+    env_path = make_environment(root)
+    with open(os.path.join(env_path, "utils.py"), "w") as f:
+        f.write(COUNTING_UTILS)
+    os.makedirs(os.path.join(env_path, "additional_files"))
+    with open(os.path.join(env_path, "additional_files", "input.txt"), "w") as f:
+        f.write("input [INPUTS]\n")
+    with open(os.path.join(env_path, "additional_files.json"), "w") as f:
+        json.dump([{"file_name": "input.txt"}], f)
+    return env_path
+
+
+def utils_calls(env_path):
+    try:
+        with open(os.path.join(env_path, "calls")) as f:
+            return f.read().split()
+    except FileNotFoundError:
+        return []
+
+
+def test_submit_with_only_static_files_does_not_evaluate_the_map(tmp_path):
+    env_path = make_counting_environment(str(tmp_path))
+    location = tmp_path / "job"
+    location.mkdir()
+    params = {"name": "static", "location": str(location), "runtime": "dyn", "env_dir": str(tmp_path)}
+
+    environment_pool.clear()
+    submit = Engine()
+    submit.set_environment("dyn", str(tmp_path))
+    submit.generate_script(dict(params, additional_files=json.dumps({"input.txt": "input static\n"})))
+
+    assert utils_calls(env_path) == []
+    assert (location / "input.txt").read_text() == "input static\n"
+
+
+def test_submit_reuses_the_streamed_files_its_preview_found(tmp_path):
+    env_path = make_counting_environment(str(tmp_path))
+    location = tmp_path / "job"
+    location.mkdir()
+    params = {"name": "job1", "location": str(location), "runtime": "dyn", "env_dir": str(tmp_path)}
+    session = (env_path, "job1")
+
+    environment_pool.clear()
+    preview = Engine()
+    preview.set_environment("dyn", str(tmp_path))
+    previewed = preview.preview_script(dict(params), session=session)
+    assert previewed["additional_files"]["blob.bin"]["streamed"]
+
+    submitted = {name: file["content"] for name, file in previewed["additional_files"].items()}
+    submit = Engine()
+    submit.set_environment("dyn", str(tmp_path))
+    submit.generate_script(dict(params, additional_files=json.dumps(submitted)), session=session)
+
+    assert utils_calls(env_path) == ["job1"]
+    with open(os.path.join(env_path, "blob.bin"), "rb") as source, open(location / "blob.bin", "rb") as copy:
+        assert copy.read() == source.read()
@@ -0,0 +1,88 @@
+import os
+import re
+from bisect import bisect_left
+
+from .retriever_cache import retriever_cache
+
+# Seconds an index is used before its script runs again, unless the element sets retrieverCacheTTL
+AUTOCOMPLETE_INDEX_TTL = int(os.getenv("DRONA_AUTOCOMPLETE_INDEX_TTL", "300"))
+
+# Results returned per query, unless the element sets autocompleteLimit
+AUTOCOMPLETE_LIMIT = 50
+
+WORD_BOUNDARY = re.compile(r"[\s/_\-.,:;()\[\]]+")
+
+
+def candidate_text(candidate):
+    """Searchable texts of a candidate: its label and value, or the candidate itself."""
+    if isinstance(candidate, dict):
+        texts = [candidate.get("label"), candidate.get("value")]
+        return [str(text).lower() for text in texts if text is not None]
+    return [str(candidate).lower()]
+
+
+class PrefixIndex:
+    """
+    Sorted prefix index over a retriever's full candidate list.
+
+    Every label and value is indexed whole and from the start of each word,
+    so "gcc" finds both "GCC/12.2" and "foss/GCC-12". Results rank whole
+    prefix matches before word matches, then shorter texts first, and fall
+    back to substring matches when prefixes find fewer than the limit.
+    """
+    def __init__(self, candidates):
+        if not isinstance(candidates, list):
+            raise ValueError("autocomplete index retrievers must return a JSON list")
+        self.candidates = candidates
+        self.texts = [candidate_text(candidate) for candidate in candidates]
+
+        entries = []
+        for i, texts in enumerate(self.texts):
+            for text in texts:
+                entries.append((text, 0, i))
+                for match in WORD_BOUNDARY.finditer(text):
+                    if match.end() < len(text):
+                        entries.append((text[match.end():], 1, i))
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT):
+        query = query.strip().lower()
+        if not query:
+            return self.candidates[:limit]
+
+        best = {}
+        start = bisect_left(self.keys, query)
+        for key, rank, i in self.entries[start:]:
+            if not key.startswith(query):
+                break
+            if rank < best.get(i, 2):
+                best[i] = rank
+
+        if len(best) < limit:
+            for i, texts in enumerate(self.texts):
+                if i not in best and any(query in text for text in texts):
+                    best[i] = 2
+
+        def order(i):
+            shortest = min(len(text) for text in self.texts[i])
+            exact = any(text == query for text in self.texts[i])
+            return (not exact, best[i], shortest, i)
+
+        return [self.candidates[i] for i in sorted(best, key=order)[:limit]]
+
+
+def search_index(script_path, query, env, args, list_candidates, ttl=None, limit=None):
+    """
+    Candidates of an autocompleteIndex element matching query.
+
+    list_candidates() returns the script's full, parsed output, listed by
+    running it with an empty SEARCH_QUERY. The PrefixIndex over it is kept
+    in the retriever cache for the element's TTL, like any cached retriever
+    output.
+    """
+    index = retriever_cache.get(script_path, dict(env, SEARCH_QUERY=""), args,
+                                lambda: PrefixIndex(list_candidates()),
+                                ttl or AUTOCOMPLETE_INDEX_TTL, kind="autocomplete_index")
+    return index.search(query, int(limit or AUTOCOMPLETE_LIMIT))
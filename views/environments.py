@@ -3,6 +3,7 @@ import os
 import json
 from .error_handler import APIError, handle_api_error
 from .utils import create_folder_if_not_exist, get_drona_dir, get_envs_dir
+from .http_cache import file_response
 from .env_repo_manager import EnvironmentRepoManager
 
 
@@ -59,12 +60,10 @@ def get_environment_route(environment):
     else:
         template_path = os.path.join(env_dir, environment, 'template.txt')
 
-    if os.path.exists(template_path):
-        template_data = open(template_path, 'r').read()
-    else:
+    if not os.path.exists(template_path):
         raise FileNotFoundError(f"{os.path.join(env_dir, environment, 'template.txt')} not found")
 
-    return template_data
+    return file_response(template_path, "text/html")
 
 @handle_api_error
 def add_environment_route():
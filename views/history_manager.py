@@ -118,9 +118,9 @@ class JobHistoryManager:
                 continue
         return transformed
 
-    def save_job(self, job_data, files, generated_files, job_id=None):
-        timestamp = datetime.now().isoformat()
-        user = os.getenv('USER')
+    def build_job_record(self, job_data, uploaded_files, generated_files, job_id=None, timestamp=None):
+        """Job record stored as env_params, and the row inserted into job_history."""
+        timestamp = timestamp or datetime.now().isoformat()
         if job_id is None:
             job_id = str(int(uuid.uuid4().int & 0xFFFFFFFFF))
         else:
@@ -135,7 +135,7 @@ class JobHistoryManager:
             'runtime': job_data.get('runtime'),
             'env_dir': job_data.get('env_dir'),
             'timestamp': timestamp,
-            'uploaded_files': [f.filename for f in files.getlist('files[]')],
+            'uploaded_files': list(uploaded_files),
             'generated_files': {
                 'bash_script': generated_files.get('bash_script'),
                 'driver_script': generated_files.get('driver_script')
@@ -146,9 +146,6 @@ class JobHistoryManager:
             'form_data': form_data
         }
 
-        if not self.db_path:
-            return False
-
         # Extract environment for the database column
         runtime = job_data.get('runtime')
         if isinstance(runtime, dict):
@@ -156,25 +153,61 @@ class JobHistoryManager:
         else:
             environment = str(runtime or 'unknown')
 
+        row = (
+            job_id,
+            job_data.get('name'),
+            environment,
+            job_data.get('location'),
+            '',  # runtime_meta initially empty string
+            timestamp,
+            None,  # status is None by default
+            json.dumps(job_record)
+        )
+        return job_record, row
+
+    def _insert_rows(self, rows):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.executemany("""
+                INSERT INTO job_history 
+                (drona_id, name, environment, location, runtime_meta, start_time, status, env_params)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+
+    def save_job(self, job_data, files, generated_files, job_id=None):
+        job_record, row = self.build_job_record(
+            job_data, [f.filename for f in files.getlist('files[]')], generated_files, job_id
+        )
+
+        if not self.db_path:
+            return False
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("PRAGMA foreign_keys = ON")
-                conn.execute("""
-                    INSERT INTO job_history 
-                    (drona_id, name, environment, location, runtime_meta, start_time, status, env_params)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    job_id,
-                    job_data.get('name'),
-                    environment,
-                    job_data.get('location'),
-                    '',  # runtime_meta initially empty string
-                    timestamp,
-                    None,  # status is None by default
-                    json.dumps(job_record)
-                ))
-                conn.commit()
-                return job_record
+            self._insert_rows([row])
+            return job_record
+        except (sqlite3.Error, PermissionError):
+            return False
+
+    def save_jobs(self, jobs):
+        """
+        Save many jobs in a single transaction. jobs yields
+        (job_data, generated_files, job_id) tuples; returns the job records,
+        or False if nothing could be saved.
+        """
+        if not self.db_path:
+            return False
+
+        timestamp = datetime.now().isoformat()
+        records, rows = [], []
+        for job_data, generated_files, job_id in jobs:
+            job_record, row = self.build_job_record(job_data, [], generated_files, job_id, timestamp)
+            records.append(job_record)
+            rows.append(row)
+
+        try:
+            self._insert_rows(rows)
+            return records
         except (sqlite3.Error, PermissionError):
             return False
 
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+from machine_driver_scripts.environment_pool import file_signature
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("DRONA_COMPRESS_MIN_BYTES", "1024"))
+
+
+def _code_version():
+    """Digest of the views package's source, which decides how files are turned into responses."""
+    digest = hashlib.sha1()
+    views_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(views_dir)):
+        if name.endswith(".py"):
+            with open(os.path.join(views_dir, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+# Part of every file-based ETag, so a deploy that changes how responses are built
+# (e.g. what resolve_schema adds to a schema) does not get 304s for old bodies
+BUILD_VERSION = os.getenv("DRONA_BUILD_VERSION") or _code_version()
+
+
+def signature_validators(signature):
+    """ETag and Last-Modified time for a response built by this build of the app only from the files in signature."""
+    etag = hashlib.sha1(repr((BUILD_VERSION, signature)).encode()).hexdigest()
+    mtimes = [mtime for _, mtime, _ in signature if mtime is not None]
+    last_modified = datetime.fromtimestamp(max(mtimes) // 10**9, timezone.utc) if mtimes else None
+    return etag, last_modified
+
+
+def content_etag(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """Whether the request's If-None-Match, or else If-Modified-Since, still matches."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def compress(response):
+    """Brotli- or gzip-encode a buffered response body the client accepts, if it is large enough."""
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(data))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def cached_response(body, mimetype, etag, last_modified=None):
+    """
+    Response with validators that browsers must revalidate before reuse.
+    A request whose validators match gets a 304 without body being read;
+    body may be bytes, a str, or a function returning either.
+    """
+    if not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = Response(body() if callable(body) else body, mimetype=mimetype)
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+    return compress(response) if response.status_code == 200 else response
+
+
+def file_response(path, mimetype):
+    """cached_response for the contents of a single file, validated by its mtime and size."""
+    etag, last_modified = signature_validators(file_signature([path]))
+
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+
+    return cached_response(read, mimetype, etag, last_modified)
@@ -1,14 +1,22 @@
 from flask import Response, stream_with_context, Blueprint, send_file, render_template, request, jsonify
+import json
 import os
 import re
 import subprocess
 import threading
-import uuid
+from concurrent.futures import ThreadPoolExecutor
+from math import prod
 from .logger import Logger
 from .history_manager import JobHistoryManager
 from .utils import create_folder_if_not_exist, get_drona_dir
-from machine_driver_scripts.engine import Engine
-from .file_utils import save_file
+from machine_driver_scripts.engine import Engine, environment_pool
+from machine_driver_scripts.timings import timing_stats
+from machine_driver_scripts.job_stage import JobStage
+from machine_driver_scripts.sweep import expand_grid, form_value, gen_drona_id, render_sweep, job_name, SharedFiles, SWEEP_WORKERS
+from .error_handler import APIError, handle_api_error
+from .schema_routes import schema_cache
+from .retriever_cache import retriever_cache, retriever_flights
+from .retriever_pool import retriever_pool, request_keys
 
 logger = Logger()
 socketio = None  # Will be initialized when passed from main app
@@ -53,17 +61,20 @@ def submit_job_route():
     if not (params.get("name") or "").strip():
         params["name"] = drona_job_id
 
-    # Filesystem side effects use the preview-computed location
-    create_folder_if_not_exist(location)
-
-    extra_files = files.getlist("files[]")
-    for f in extra_files:
-        save_file(f, location)
-
+    # Filesystem side effects use the preview-computed location. Everything is
+    # written to a staging directory first and only moved into place once all
+    # of it succeeded, so a failed submit leaves no half-written job directory.
     engine = Engine()
     engine.set_environment(params.get("runtime"), params.get("env_dir"))
-    bash_script_path = engine.generate_script(params)
-    driver_script_path = engine.generate_driver_script(params)
+
+    with JobStage(location) as stage:
+        extra_files = files.getlist("files[]")
+        for f in extra_files:
+            stage.save_upload(f)
+
+        bash_script_path = engine.generate_script(params, output_dir=stage.path,
+                                                  session=preview_session(params, drona_job_id))
+        driver_script_path = engine.generate_driver_script(params, output_dir=stage.path)
 
     bash_cmd = f"bash {driver_script_path}"
 
@@ -89,13 +100,11 @@ def submit_job_route():
 
 
 
-def preview_job_route():
-    """Preview a job script without submitting it"""
-    params = request.form.to_dict(flat=True)
-
-    def gen_drona_id():
-        return str(int(uuid.uuid4().int & 0xFFFFFFFFF))
+def parse_bool(v):
+    return str(v).strip().lower() in ("1", "true", "t", "yes", "y", "on")
 
+def prepare_preview_params(params):
+    """Decide drona_job_id, name and location for a preview; updates params and returns drona_job_id"""
     def parse_deprecated_id(raw: str):
         raw = (raw or "").strip()
         if raw.endswith("*"):
@@ -103,9 +112,6 @@ def preview_job_route():
         return raw, False
     
  
-    def parse_bool(v):
-        return str(v).strip().lower() in ("1", "true", "t", "yes", "y", "on")
-
     def strip_trailing_component(path: str, comp: str):
         """If path ends with /comp (or /comp*), remove it."""
         if not path or not comp:
@@ -166,11 +172,22 @@ def preview_job_route():
         location_effective = ensure_component_appended(location_effective, effective_name)
 
     params["location"] = location_effective
+    return drona_job_id
+
+def preview_session(params, drona_job_id):
+    """Repeat previews of the same job only re-evaluate map values whose inputs changed"""
+    return (os.path.abspath(os.path.join(params.get("env_dir"), params.get("runtime"))), drona_job_id)
+
+def preview_job_route():
+    """Preview a job script without submitting it"""
+    params = request.form.to_dict(flat=True)
+    drona_job_id = prepare_preview_params(params)
 
     # 6) Preview
     engine = Engine()
     engine.set_environment(params.get("runtime"), params.get("env_dir"))
-    preview_job = engine.preview_script(params)
+    preview_job = engine.preview_script(params, session=preview_session(params, drona_job_id),
+                                        timings=parse_bool(params.get("timings", False)))
 
     # Return fields client injects back into form
     preview_job["drona_job_id"] = drona_job_id
@@ -181,7 +198,172 @@ def preview_job_route():
 
     return jsonify(preview_job)
 
+def preview_job_stream_route():
+    """
+    Preview a job as newline-delimited JSON events. The first event carries
+    the fields the client injects back into the form, the rest come from
+    Engine.preview_script_iter as each file finishes rendering.
+    """
+    params = request.form.to_dict(flat=True)
+    drona_job_id = prepare_preview_params(params)
+
+    engine = Engine()
+    engine.set_environment(params.get("runtime"), params.get("env_dir"))
+    session = preview_session(params, drona_job_id)
+
+    def generate():
+        yield json.dumps({
+            "type": "job",
+            "drona_job_id": drona_job_id,
+            "name": params["name"],
+            "location": params["location"],
+            "env_name": params.get("env_name"),
+            "env_dir": params.get("env_dir")
+        }) + "\n"
+        try:
+            for event in engine.preview_script_iter(params, session=session,
+                                                    timings=parse_bool(params.get("timings", False))):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+
+# Upper bound on the number of jobs one /batch request may create
+BATCH_MAX_JOBS = int(os.getenv("DRONA_BATCH_MAX_JOBS", "5000"))
+
+def run_driver_script(job):
+    """Run a rendered job's run.sh like the composer does after /submit"""
+    completed = subprocess.run(
+        ["bash", job["generated_files"]["driver_script"]],
+        cwd=job["params"]["location"], capture_output=True, text=True
+    )
+    return {
+        "returncode": completed.returncode,
+        "job_id": extract_job_id(completed.stdout),
+        "output": (completed.stdout + completed.stderr)[-2000:]
+    }
+
+@handle_api_error
+def batch_job_route():
+    """
+    Render, record and optionally submit one job per parameter combination.
+
+    JSON body: runtime, env_dir, env_name, params (form values shared by all
+    jobs), grid ({field: [values, ...]}) and/or combinations ([{field: value}]),
+    optional location, name, workers and submit.
+    """
+    body = request.get_json(silent=True) or {}
+    runtime = body.get("runtime")
+    env_dir = body.get("env_dir")
+    if not runtime or not env_dir:
+        raise APIError("runtime and env_dir are required", status_code=400)
+
+    grid = body.get("grid") or {}
+    combinations = body.get("combinations")
+    if not grid and not combinations:
+        raise APIError("Either grid or combinations is required", status_code=400)
+    if not isinstance(grid, dict) or any(not isinstance(values, list) for values in grid.values()):
+        raise APIError("Grid must be an object whose values are lists", status_code=400)
+    if combinations and (not isinstance(combinations, list)
+                         or any(not isinstance(combination, dict) for combination in combinations)):
+        raise APIError("Combinations must be a list of objects", status_code=400)
+
+    grid_size = prod(len(values) for values in grid.values())
+    count = grid_size * (len(combinations) if combinations else 1)
+    if count > BATCH_MAX_JOBS:
+        raise APIError(f"Batch of {count} jobs exceeds the limit of {BATCH_MAX_JOBS}", status_code=400)
+
+    # Combinations are expanded lazily, once to check job names and again while jobs render
+    def batch_overrides():
+        if combinations and grid:
+            return ({**combination, **point} for combination in combinations for point in expand_grid(grid))
+        if combinations:
+            return iter(combinations)
+        return expand_grid(grid)
+
+    base_params = {key: form_value(value) for key, value in (body.get("params") or {}).items()}
+    base_params.update({"runtime": runtime, "env_dir": env_dir, "env_name": body.get("env_name", runtime)})
+    if body.get("name"):
+        base_params["name"] = form_value(body["name"])
+
+    # Each name becomes a directory under location
+    names = set()
+    for index, overrides in enumerate(batch_overrides()):
+        name = job_name(base_params, runtime, index, overrides)
+        if not name.strip() or name in (".", "..") or "/" in name or "\\" in name:
+            raise APIError(f"Invalid job name: {name!r}", status_code=400)
+        if name in names:
+            raise APIError(f"Job name {name!r} is used by more than one combination", status_code=400)
+        names.add(name)
+
+    try:
+        workers = int(body["workers"]) if body.get("workers") is not None else SWEEP_WORKERS
+    except (TypeError, ValueError):
+        raise APIError("workers must be an integer", status_code=400)
+    if workers < 1:
+        raise APIError("workers must be at least 1", status_code=400)
+    workers = min(workers, SWEEP_WORKERS)
+
+    sweep_id = gen_drona_id()
+    location = (body.get("location") or "").strip()
+    if not location:
+        drona = get_drona_dir()
+        if not drona.get("ok"):
+            raise APIError("Drona not configured", status_code=400, details=drona.get("reason"))
+        location = os.path.join(drona["drona_dir"], "runs", f"batch_{sweep_id}")
+    create_folder_if_not_exist(location)
+
+    shared = SharedFiles(os.path.join(location, ".shared"))
+    results = list(render_sweep(runtime, env_dir, base_params, batch_overrides(), location, workers, shared))
+    rendered = [result for result in results if "error" not in result]
 
+    history_manager = JobHistoryManager()
+    history_manager.save_jobs(
+        (result["params"], result["generated_files"], result["params"]["drona_job_id"]) for result in rendered
+    )
+
+    submissions = {}
+    if body.get("submit"):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result, submission in zip(rendered, executor.map(run_driver_script, rendered)):
+                submissions[result["index"]] = submission
+
+    jobs = []
+    for result in results:
+        job = {"index": result["index"], "overrides": result["overrides"]}
+        if "error" in result:
+            job["error"] = result["error"]
+        else:
+            params = result["params"]
+            job.update({
+                "drona_job_id": params["drona_job_id"],
+                "name": params["name"],
+                "location": params["location"],
+                "bash_cmd": f"bash {result['generated_files']['driver_script']}"
+            })
+            if result["messages"]:
+                job["messages"] = result["messages"]
+            if result["index"] in submissions:
+                job["submission"] = submissions[result["index"]]
+        jobs.append(job)
+
+    manifest = {
+        "sweep_id": sweep_id,
+        "location": location,
+        "runtime": runtime,
+        "env_dir": env_dir,
+        "count": len(jobs),
+        "failed": len(jobs) - len(rendered),
+        "shared_files": shared.linked,
+        "jobs": jobs
+    }
+    with open(os.path.join(location, f"batch_{sweep_id}.json"), "w") as f:
+        json.dump(manifest, f)
+
+    return jsonify(manifest)
 
 def get_history_route():
     """Get job history for the current user"""
@@ -199,6 +381,18 @@ def get_job_from_history_route(job_id):
 
     return jsonify(job_data)
 
+def get_engine_stats_route():
+    """Cache statistics of the job engine in this process"""
+    return jsonify({
+        "environment_pool": environment_pool.stats(),
+        "schema_cache": schema_cache.stats(),
+        "retriever_cache": retriever_cache.stats(),
+        "retriever_flights": retriever_flights.stats(),
+        "retriever_pool": retriever_pool.stats(),
+        "retriever_requests": request_keys.stats(),
+        "timings": timing_stats.summary()
+    })
+
 def register_job_routes(blueprint, socketio_instance=None):
     """Register all job-related routes to the blueprint and initialize socketio"""
     global socketio
@@ -207,5 +401,8 @@ def register_job_routes(blueprint, socketio_instance=None):
     # Register HTTP routes
     blueprint.route('/submit', methods=['POST'])(submit_job_route)
     blueprint.route('/preview', methods=['POST'])(preview_job_route)
+    blueprint.route('/preview/stream', methods=['POST'])(preview_job_stream_route)
+    blueprint.route('/batch', methods=['POST'])(batch_job_route)
     blueprint.route('/history', methods=['GET'])(get_history_route)
     blueprint.route('/history/<int:job_id>', methods=['GET'])(get_job_from_history_route)
+    blueprint.route('/engine/stats', methods=['GET'])(get_engine_stats_route)
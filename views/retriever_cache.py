@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .retriever_pool import RetrieverCancelled
+
+# Retriever results kept per process
+RETRIEVER_CACHE_SIZE = int(os.getenv("DRONA_RETRIEVER_CACHE_SIZE", "256"))
+
+
+def retriever_key(script_path, env, args):
+    """Identity of a retriever invocation: script, its mtime, normalized environment and arguments."""
+    script_path = os.path.realpath(script_path)
+    try:
+        mtime = os.stat(script_path).st_mtime_ns
+    except OSError:
+        mtime = None
+    return (script_path, mtime, tuple(sorted((str(k), str(v)) for k, v in (env or {}).items())), tuple(args or ()))
+
+
+class _Flight:
+    __slots__ = ("done", "cancel", "interest", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.cancel = threading.Event()
+        self.interest = 0
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while one call for a key runs,
+    later callers with the same key wait for it and share its result or
+    exception instead of running their own.
+
+    Callers may pass a CancelToken. A cancelled caller stops waiting, and
+    once every caller of a flight is cancelled its cancel event, which
+    function(cancel) receives, is set so the run itself can stop.
+    """
+    def __init__(self):
+        self._flights = {}
+        self._executed = 0
+        self._coalesced = 0
+        self._lock = threading.Lock()
+
+    def do(self, key, function, token=None):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._coalesced += 1
+            flight.interest += 1
+        if token is not None:
+            token.on_cancel(lambda: self._lose_interest(flight))
+
+        if not leader:
+            while not flight.done.wait(0.05):
+                if token is not None and token.cancelled:
+                    raise RetrieverCancelled("Retriever was superseded by a newer request")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = function(flight.cancel)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self._executed += 1
+            flight.done.set()
+
+    def _lose_interest(self, flight):
+        with self._lock:
+            flight.interest -= 1
+            if flight.interest <= 0:
+                flight.cancel.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._flights)
+            }
+
+
+class RetrieverCache:
+    """
+    LRU of retriever script outputs, used by requests that carry a TTL.
+
+    The TTL comes with each request (from the element's retrieverCacheTTL
+    in schema.json), so elements and environments sharing a script each
+    get the freshness they asked for. Entries are keyed on the script path,
+    its mtime and the normalized environment the script runs with, and
+    remember when they were stored. An entry older than the TTL is still
+    served for up to `stale` more seconds (default: the TTL) while one
+    background thread refreshes it; after that a request runs the script
+    itself. Failed refreshes drop the entry so the next request reports
+    the error. kind separates different values derived from the same run.
+    """
+    def __init__(self, maxsize=256):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key, run):
+        try:
+            self._store(key, run())
+        except Exception:
+            with self._lock:
+                self._entries.pop(key, None)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, script_path, env, args, run, ttl=None, stale=None, kind="output"):
+        """Output of run() for the script invoked with env and args, cached for ttl seconds when given."""
+        if not ttl or ttl <= 0:
+            return run()
+        stale = ttl if stale is None else stale
+
+        key = (kind,) + retriever_key(script_path, env, args)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored = entry
+                if now < stored + ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                if now < stored + ttl + stale:
+                    self._entries.move_to_end(key)
+                    self._stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, run), daemon=True).start()
+                    return value
+            self._misses += 1
+
+        value = run()
+        self._store(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "size": len(self._entries),
+                "maxsize": self._maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PrefetchResults:
+    """
+    LRU of retriever outputs prefetched for /schema, each kept until its
+    own expiry, plus the prefetches still running. A run that outlasts one
+    request's budget is reused by the next request instead of started again.
+    """
+    def __init__(self, maxsize):
+        self._maxsize = maxsize
+        self._outputs = OrderedDict()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The stored output for key, or None when there is none or it expired."""
+        with self._lock:
+            entry = self._outputs.get(key)
+            if entry is None:
+                return None
+            output, expires = entry
+            if time.monotonic() >= expires:
+                del self._outputs[key]
+                return None
+            self._outputs.move_to_end(key)
+            return output
+
+    def start(self, key, ttl, submit):
+        """
+        (future, started) for key: the future already running for it, or a
+        new one from submit(). A successful output is stored for ttl seconds;
+        with no ttl it is only returned to the requests waiting on the future.
+        """
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                return future, False
+            future = self._running[key] = submit()
+
+        def store(done):
+            with self._lock:
+                self._running.pop(key, None)
+                if ttl and done.exception() is None:
+                    self._outputs[key] = (done.result(), time.monotonic() + ttl)
+                    self._outputs.move_to_end(key)
+                    while len(self._outputs) > self._maxsize:
+                        self._outputs.popitem(last=False)
+
+        future.add_done_callback(store)
+        return future, True
+
+    def clear(self):
+        with self._lock:
+            self._outputs.clear()
+
+
+retriever_cache = RetrieverCache(RETRIEVER_CACHE_SIZE)
+retriever_flights = SingleFlight()
+prefetch_results = PrefetchResults(RETRIEVER_CACHE_SIZE)
@@ -0,0 +1,370 @@
+import codecs
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retriever_worker.py")
+
+# Worker processes running Python retrievers when DRONA_RETRIEVER_PYTHON is set;
+# 0 runs every script in a new process instead
+RETRIEVER_WORKERS = int(os.getenv("DRONA_RETRIEVER_WORKERS", "4"))
+
+# Seconds any retriever may run before it is killed, in the pool, run_direct or a
+# RetrieverStream; 0 lets it run until it exits
+RETRIEVER_TIMEOUT = float(os.getenv("DRONA_RETRIEVER_TIMEOUT", "60"))
+
+# Run *.py retrievers with Python inside the workers instead of with bash like every other retriever
+RETRIEVER_PYTHON = os.getenv("DRONA_RETRIEVER_PYTHON", "0") == "1"
+
+# Calls after which a worker is replaced, so state left behind by retrievers does not pile up
+RETRIEVER_WORKER_MAX_CALLS = int(os.getenv("DRONA_RETRIEVER_WORKER_MAX_CALLS", "200"))
+
+# Seconds between checks for cancellation while waiting on a retriever
+CANCEL_POLL_INTERVAL = 0.05
+
+# Bytes of stdout a streamed retriever may write before it is stopped
+RETRIEVER_STREAM_MAX_BYTES = int(os.getenv("DRONA_RETRIEVER_STREAM_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+class RetrieverTimeout(Exception):
+    pass
+
+
+def runs_in_python(script):
+    return RETRIEVER_PYTHON and script.endswith(".py")
+
+
+def deadline_for(timeout):
+    """Monotonic time by which a run must end, or None when timeout is 0 (no limit)."""
+    return time.monotonic() + timeout if timeout and timeout > 0 else None
+
+
+def wait_time(deadline, cancel=None):
+    """How long to block waiting for output: until the deadline, in short steps while cancel can be set."""
+    remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+    if cancel is None:
+        return remaining
+    return CANCEL_POLL_INTERVAL if remaining is None else min(remaining, CANCEL_POLL_INTERVAL)
+
+
+class RetrieverCancelled(Exception):
+    pass
+
+
+class RetrieverOutputLimit(Exception):
+    pass
+
+
+class CancelToken:
+    """Cancellation flag of one retriever request, with callbacks run when it is cancelled."""
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class RequestKeys:
+    """
+    The latest request per client-chosen key, such as a form element in
+    one browser tab. Starting a request cancels the previous one for its key.
+    """
+    def __init__(self):
+        self._tokens = {}
+        self._superseded = 0
+        self._lock = threading.Lock()
+
+    def start(self, key):
+        token = CancelToken()
+        with self._lock:
+            previous = self._tokens.get(key)
+            self._tokens[key] = token
+            if previous is not None:
+                self._superseded += 1
+        if previous is not None:
+            previous.cancel()
+        return token
+
+    def finish(self, key, token):
+        with self._lock:
+            if self._tokens.get(key) is token:
+                del self._tokens[key]
+
+    def stats(self):
+        with self._lock:
+            return {"active": len(self._tokens), "superseded": self._superseded}
+
+
+class RetrieverWorker:
+    """One retriever_worker.py process and the pipes to it."""
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-u", WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        self.calls = 0
+
+    def call(self, request, timeout, cancel=None):
+        self.calls += 1
+        self.process.stdin.write(json.dumps(request).encode() + b"\n")
+        self.process.stdin.flush()
+
+        deadline = deadline_for(timeout)
+        stdout = self.process.stdout
+        chunks = []
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise RetrieverTimeout(f"Retriever did not finish within {timeout:g} seconds")
+            if cancel is not None and cancel.is_set():
+                raise RetrieverCancelled("Retriever was superseded by a newer request")
+            ready, _, _ = select.select([stdout], [], [], wait_time(deadline, cancel))
+            if not ready:
+                continue
+            chunk = os.read(stdout.fileno(), 65536)
+            if not chunk:
+                raise OSError("Retriever worker exited unexpectedly")
+            chunks.append(chunk)
+            if chunk.endswith(b"\n"):
+                return json.loads(b"".join(chunks))
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        """Kill the worker together with any processes its retriever started."""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.wait()
+
+    def close(self):
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.kill()
+
+
+def run_direct(script, args, env, cwd, timeout, cancel=None):
+    """Run a retriever in a new process group, for when the pool is disabled."""
+    interpreter = [sys.executable] if runs_in_python(script) else ["bash"]
+    process = subprocess.Popen(
+        interpreter + [os.path.basename(script)] + list(args),
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, cwd=cwd, env=dict(os.environ, **env), start_new_session=True
+    )
+    deadline = deadline_for(timeout)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=CANCEL_POLL_INTERVAL)
+            return {"returncode": process.returncode, "stdout": stdout, "stderr": stderr}
+        except subprocess.TimeoutExpired:
+            error = None
+            if deadline is not None and time.monotonic() >= deadline:
+                error = RetrieverTimeout(f"Retriever did not finish within {timeout:g} seconds")
+            elif cancel is not None and cancel.is_set():
+                error = RetrieverCancelled("Retriever was superseded by a newer request")
+            if error is not None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                process.communicate()
+                raise error
+
+
+class RetrieverStream:
+    """
+    A retriever run in its own process group whose stdout is yielded as text
+    while it is written. The process starts when iteration begins; once it
+    ends, returncode and stderr are set. Exceeding timeout or max_bytes,
+    setting cancel, or closing the iterator early kills the process group.
+    """
+    def __init__(self, script, args=None, env=None, cwd=None, timeout=RETRIEVER_TIMEOUT,
+                 max_bytes=RETRIEVER_STREAM_MAX_BYTES, cancel=None):
+        self.script = script
+        self.args = [str(arg) for arg in (args or [])]
+        self.env = {str(k): str(v) for k, v in (env or {}).items()}
+        self.cwd = cwd or os.path.dirname(os.path.abspath(script))
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.cancel = cancel
+        self.returncode = None
+        self.stderr = ""
+
+    def __iter__(self):
+        interpreter = [sys.executable] if runs_in_python(self.script) else ["bash"]
+        # Python would otherwise hold back output written to a pipe until it exits
+        env = dict(os.environ, PYTHONUNBUFFERED="1", **self.env)
+        process = subprocess.Popen(
+            interpreter + [os.path.basename(self.script)] + self.args,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=self.cwd, env=env, start_new_session=True
+        )
+        names = {process.stdout.fileno(): "stdout", process.stderr.fileno(): "stderr"}
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        deadline = deadline_for(self.timeout)
+        written = 0
+        stderr = []
+        try:
+            while names:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise RetrieverTimeout(f"Retriever did not finish within {self.timeout:g} seconds")
+                if self.cancel is not None and self.cancel.is_set():
+                    raise RetrieverCancelled("Retriever was superseded by a newer request")
+                ready, _, _ = select.select(list(names), [], [], CANCEL_POLL_INTERVAL)
+                for fd in ready:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        del names[fd]
+                    elif names[fd] == "stderr":
+                        stderr.append(chunk)
+                    else:
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise RetrieverOutputLimit(f"Retriever output exceeded {self.max_bytes} bytes")
+                        text = decoder.decode(chunk)
+                        if text:
+                            yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+            try:
+                self.returncode = process.wait(timeout=wait_time(deadline))
+            except subprocess.TimeoutExpired:
+                raise RetrieverTimeout(f"Retriever did not finish within {self.timeout:g} seconds")
+            self.stderr = b"".join(stderr).decode(errors="replace")
+        finally:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+
+class RetrieverPool:
+    """
+    Long-lived worker processes that run Python retrievers in-process.
+
+    Only *.py retrievers with DRONA_RETRIEVER_PYTHON set go to a worker;
+    everything else, and any call arriving while all `size` workers are
+    busy, runs in a new process with run_direct, so the pool never limits
+    how many retrievers run at once. Workers are started on demand and are
+    reused for up to max_calls calls. A call that exceeds its timeout, or
+    whose cancel event is set, kills the worker's whole process group and
+    the worker is replaced. env only carries the variables to set on top of
+    this process's environment.
+    """
+    def __init__(self, size=RETRIEVER_WORKERS, timeout=RETRIEVER_TIMEOUT, max_calls=RETRIEVER_WORKER_MAX_CALLS):
+        self.size = size
+        self.timeout = timeout
+        self.max_calls = max_calls
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+        self._lock = threading.Lock()
+        self._started = 0
+        self._recycled = 0
+        self._timeouts = 0
+        self._cancelled = 0
+        self._direct = 0
+
+    def run(self, script, args=None, env=None, cwd=None, timeout=None, cancel=None):
+        """
+        Run script and return {"returncode", "stdout", "stderr"}. Raises
+        RetrieverTimeout, or RetrieverCancelled once the cancel event is set.
+        """
+        timeout = timeout or self.timeout
+        args = [str(arg) for arg in (args or [])]
+        env = {str(k): str(v) for k, v in (env or {}).items()}
+        cwd = cwd or os.path.dirname(os.path.abspath(script))
+        try:
+            if self.size <= 0 or not runs_in_python(script) or not self._slots.acquire(blocking=False):
+                with self._lock:
+                    self._direct += 1
+                return run_direct(script, args, env, cwd, timeout, cancel)
+            try:
+                worker = self._checkout()
+                try:
+                    result = worker.call({"script": script, "args": args, "env": env, "cwd": cwd}, timeout, cancel)
+                except Exception:
+                    worker.kill()
+                    raise
+                self._checkin(worker)
+            finally:
+                self._slots.release()
+            return result
+        except RetrieverTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise
+        except RetrieverCancelled:
+            with self._lock:
+                self._cancelled += 1
+            raise
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+            self._started += 1
+        return RetrieverWorker()
+
+    def _checkin(self, worker):
+        if worker.calls >= self.max_calls or not worker.alive():
+            with self._lock:
+                self._recycled += 1
+            worker.close()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "started": self._started,
+                "recycled": self._recycled,
+                "timeouts": self._timeouts,
+                "cancelled": self._cancelled,
+                "direct": self._direct,
+                "timeout": self.timeout,
+                "max_calls": self.max_calls
+            }
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+retriever_pool = RetrieverPool()
+request_keys = RequestKeys()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Retriever worker process, started and fed by views/retriever_pool.py.
+
+Reads one JSON request per line on stdin:
+    {"script": path, "args": [...], "env": {...}, "cwd": dir}
+and answers each with one JSON line {"returncode", "stdout", "stderr"}.
+env holds only the variables to set on top of the environment the worker
+was started with.
+
+The pool only sends Python retrievers (*.py, with DRONA_RETRIEVER_PYTHON
+set). They run inside the worker with runpy, so modules they import stay
+loaded for later calls. Only the
+standard library is used so the worker starts quickly.
+"""
+import json
+import os
+import runpy
+import sys
+import tempfile
+import traceback
+
+
+def run_python(script, args, env, cwd):
+    """Run a Python retriever in this process; fds 1 and 2 are redirected to capture all output."""
+    saved_environ = dict(os.environ)
+    saved_argv, saved_path, saved_cwd = sys.argv, list(sys.path), os.getcwd()
+
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        returncode = 0
+        try:
+            os.environ.clear()
+            os.environ.update(env)
+            os.chdir(cwd)
+            sys.argv = [script] + list(args)
+            sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+            runpy.run_path(script, run_name="__main__")
+        except SystemExit as e:
+            if e.code is None:
+                returncode = 0
+            elif isinstance(e.code, int):
+                returncode = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except BaseException:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(NULL_FD, 1)
+            os.dup2(NULL_FD, 2)
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            sys.argv, sys.path[:] = saved_argv, saved_path
+            os.chdir(saved_cwd)
+
+        out.seek(0)
+        err.seek(0)
+        return returncode, out.read().decode(errors="replace"), err.read().decode(errors="replace")
+
+
+def main():
+    # Keep the protocol on private descriptors so retrievers and their
+    # children can neither read requests nor write into responses
+    requests = os.fdopen(os.dup(0), "rb")
+    responses = os.fdopen(os.dup(1), "wb")
+    os.dup2(NULL_FD, 0)
+    os.dup2(NULL_FD, 1)
+    sys.stdin = open(os.devnull)
+
+    base_env = dict(os.environ)
+    for line in requests:
+        call = json.loads(line)
+        env = dict(base_env, **call.get("env", {}))
+        script = call["script"]
+        cwd = call.get("cwd") or os.path.dirname(os.path.abspath(script))
+        try:
+            returncode, stdout, stderr = run_python(script, call.get("args", []), env, cwd)
+        except Exception:
+            returncode, stdout, stderr = 1, "", traceback.format_exc()
+        responses.write(json.dumps({"returncode": returncode, "stdout": stdout, "stderr": stderr}).encode() + b"\n")
+        responses.flush()
+
+
+NULL_FD = os.open(os.devnull, os.O_RDWR)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import jsonref
+
+from machine_driver_scripts.environment_pool import file_signature
+
+# Resolved schemas kept per process
+SCHEMA_CACHE_SIZE = int(os.getenv("DRONA_SCHEMA_CACHE_SIZE", "64"))
+
+
+class TrackingLoader:
+    """jsonref loader that records every local file a schema's $refs pull in."""
+    def __init__(self):
+        self.paths = []
+        self.remote = False
+
+    def __call__(self, uri, **kwargs):
+        parsed = urlparse(uri)
+        if parsed.scheme == "file":
+            self.paths.append(url2pathname(parsed.path))
+        else:
+            self.remote = True
+        return jsonref.jsonloader(uri, **kwargs)
+
+
+class SchemaCache:
+    """
+    LRU of fully resolved, encoded schemas keyed by environment directory.
+
+    resolver(schema_path, loader) returns what get() serves; loader must be
+    passed to jsonref so the files its $refs load are known. An entry is
+    served as long as schema.json and all of those files keep their mtime
+    and size. Schemas with remote $refs are resolved on every request.
+    """
+    def __init__(self, resolver, maxsize=64):
+        self._resolver = resolver
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, schema_path):
+        return self.entry(schema_path)[1]
+
+    def entry(self, schema_path):
+        """
+        (signature, data) for schema_path, where signature lists every file
+        the data was resolved from, or is None for schemas with remote $refs.
+        """
+        schema_path = os.path.abspath(schema_path)
+
+        with self._lock:
+            entry = self._entries.get(schema_path)
+        if entry is not None and file_signature(p for p, _, _ in entry[0]) == entry[0]:
+            with self._lock:
+                if schema_path in self._entries:
+                    self._entries.move_to_end(schema_path)
+                self._hits += 1
+            return entry
+
+        loader = TrackingLoader()
+        # Stat before resolving so an edit made meanwhile invalidates the entry
+        signature = file_signature([schema_path])
+        data = self._resolver(schema_path, loader)
+        signature += file_signature(dict.fromkeys(loader.paths))
+
+        with self._lock:
+            self._misses += 1
+            self._entries.pop(schema_path, None)
+            if not loader.remote:
+                self._entries[schema_path] = (signature, data)
+                while len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+        return (None if loader.remote else signature), data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._entries),
+                "maxsize": self._maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
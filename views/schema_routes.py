@@ -1,12 +1,51 @@
-from flask import request, jsonify, current_app as app
+from flask import Response, stream_with_context, request, jsonify, current_app as app
 import os
 import json
 import jsonref
-import subprocess
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from .error_handler import APIError, handle_api_error
 from copy import deepcopy
 from .utils import get_envs_dir, get_runtime_dir
+from .schema_cache import SchemaCache, SCHEMA_CACHE_SIZE
+from .http_cache import cached_response, content_etag, file_response, signature_validators
+from .retriever_cache import retriever_cache, retriever_flights, retriever_key, prefetch_results
+from .autocomplete_index import search_index
+from .retriever_pool import (
+    retriever_pool, request_keys, RetrieverStream, RetrieverTimeout, RetrieverCancelled, RetrieverOutputLimit
+)
+
+# Retriever scripts running at once for this user's server, across all batch requests
+RETRIEVER_CONCURRENCY = int(os.getenv("DRONA_RETRIEVER_CONCURRENCY", "8"))
+retriever_slots = threading.BoundedSemaphore(RETRIEVER_CONCURRENCY)
+
+# Upper bound on the number of retrievers in one /evaluate_scripts request
+RETRIEVER_BATCH_MAX = 256
+
+# Element types whose retrievers the client sends through /evaluate_scripts
+BATCHED_RETRIEVER_TYPES = {"dynamicSelect", "dynamicCheckboxGroup", "dynamicRadioGroup"}
+
+# Seconds /schema waits for field-independent retrievers before responding; 0 disables prefetching
+SCHEMA_PREFETCH_BUDGET = float(os.getenv("DRONA_SCHEMA_PREFETCH_BUDGET", "0.5"))
+
+# Seconds a retriever that missed the prefetch budget is not started again by later prefetches
+SLOW_RETRIEVER_BACKOFF = 600
+
+# Element types that fetch their retriever as soon as they render
+PREFETCH_RETRIEVER_TYPES = BATCHED_RETRIEVER_TYPES | {"staticText"}
+
+slow_retrievers = {}
+slow_retrievers_lock = threading.Lock()
+
+# Runs prefetches, which may outlive the /schema request that started them
+prefetch_executor = ThreadPoolExecutor(max_workers=RETRIEVER_CONCURRENCY)
+
+# Query arguments that configure a retriever call instead of becoming its environment variables
+RETRIEVER_REQUEST_ARGS = {
+    "retriever_path", "request_key", "cache_ttl", "cache_stale", "autocomplete_index", "autocomplete_limit"
+}
 
 CONTAINER_TYPES = {
     "rowContainer", "container", "collapsibleRowContainer",
@@ -23,12 +62,35 @@ def iterate_schema(schema_dict):
         if value.get("type") in CONTAINER_TYPES and "elements" in value:
             yield from iterate_schema(value["elements"])
 
+def iterate_schema_paths(schema_dict, path=()):
+    """Like iterate_schema, yielding each element's key path instead of its key"""
+    for key, value in schema_dict.items():
+        if not isinstance(value, dict):
+            continue
+        yield path + (key,), value
+
+        if value.get("type") in CONTAINER_TYPES and "elements" in value:
+            yield from iterate_schema_paths(value["elements"], path + (key, "elements"))
+
+def is_prefetchable(element):
+    """Whether an element's retriever runs on render without depending on any form field"""
+    if element.get("type") not in PREFETCH_RETRIEVER_TYPES or element.get("retrieverPrefetch") is False:
+        return False
+    if element.get("type") == "staticText" and not element.get("isDynamic"):
+        return False
+    params = element.get("retrieverParams") or {}
+    if not isinstance(params, dict):
+        return False
+    return not any(isinstance(value, str) and value.startswith("$") for value in params.values())
+
 def execute_script(
     retriever_path, 
     env_vars=None, 
     script_type="Generic", 
     parse_json=False, 
     additional_args=None,
+    request_key=None,
+    options=None,
 ):
     """
     Generic function to execute external scripts with standardized error handling.
@@ -39,6 +101,10 @@ def execute_script(
         script_type (str, optional): Type of script for error messages
         parse_json (bool, optional): Whether to parse the output as JSON
         additional_args (list, optional): Additional command-line arguments
+        request_key (str, optional): Client key of the request; a newer request
+            with the same key stops this one
+        options (dict, optional): The calling element's retriever options, see
+            retriever_options
         
     Returns:
         The script output (parsed as JSON if parse_json=True)
@@ -49,22 +115,7 @@ def execute_script(
     if not retriever_path:
         raise APIError(f"{script_type} script path is required", status_code=400)
 
-    final_retriever_path = retriever_path
-    if not os.path.isabs(retriever_path):
-        final_retriever_path = os.path.join(env_vars["DRONA_ENV_DIR"], retriever_path)
-
-    if not os.path.exists(final_retriever_path):
-        fallback_path = os.path.join(get_runtime_dir(), "retriever_scripts", retriever_path)
-        if os.path.exists(fallback_path):
-            final_retriever_path = fallback_path
-        else:
-            raise APIError(
-                f"{script_type} script not found in any of the searched paths",
-                status_code=404,
-                details={"path 1": final_retriever_path, "path 2": fallback_path}
-            )
-    
-    retriever_path = final_retriever_path
+    retriever_path = resolve_retriever_path(retriever_path, (env_vars or {}).get("DRONA_ENV_DIR"), script_type)
     retriever_dir = os.path.dirname(os.path.abspath(retriever_path))
     retriever_script = os.path.basename(retriever_path)
     
@@ -72,69 +123,132 @@ def execute_script(
     if additional_args:
         cmd += " " + " ".join(additional_args)
     
-    execution_env = os.environ.copy()
+    execution_env = build_retriever_env(env_vars)
+    options = options or {}
 
-    execution_env["DRONA_RUNTIME_DIR"] = get_runtime_dir() 
+    token = request_keys.start(request_key) if request_key else None
 
-    if env_vars:
-        for key, value in env_vars.items():
-            try:
-                parsed = json.loads(value)
-                env_vars[key] = parsed.get('value', parsed) if isinstance(parsed, dict) else str(parsed)
-            except:
-                pass
-        execution_env.update(env_vars)
-    
-    try:
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            cwd=retriever_dir,
-            env=execution_env
-        )
-        
-        if result.returncode != 0:
+    def run(env=execution_env):
+        # Identical calls already running share that run's result
+        return retriever_flights.do(retriever_key(retriever_path, env, additional_args),
+                                    lambda cancel: run_script(env, cancel), token)
+
+    def run_script(env, cancel):
+        try:
+            result = retriever_pool.run(retriever_path, additional_args, env, retriever_dir, cancel=cancel)
+        except RetrieverTimeout as e:
             raise APIError(
-                f"The {script_type.lower()} script failed with non-zero exit code: {result.returncode}",
-                status_code=400,
+                f"The {script_type.lower()} script timed out",
+                status_code=504,
+                details={'error': str(e), 'script': retriever_path, 'cmd': cmd}
+            )
+        except OSError as e:
+            raise APIError(
+                f"Failed to execute {script_type.lower()} script",
+                status_code=500,
+                details={'error': str(e), 'script': retriever_path, 'cmd': cmd}
+            )
+
+        if result["returncode"] != 0:
+            raise APIError(
+                f"Failed to execute {script_type.lower()} script",
+                status_code=500,
                 details={
+                    'error': f"Command '{cmd}' returned non-zero exit status {result['returncode']}.",
+                    'stderr': result["stderr"],
                     'script': retriever_path,
-                    'error': result.stderr,
-                    'output': result.stdout[:500] + ('...' if len(result.stdout) > 500 else '')
+                    'cmd': cmd
                 }
             )
-        
-        if parse_json:
+        return result["stdout"]
+
+    def parse(output):
+        try:
+            return json.loads(output)
+        except json.JSONDecodeError as e:
+            raise APIError(
+                f"The {script_type.lower()} script did not return valid JSON",
+                status_code=400,
+                details={
+                    'error': str(e),
+                    'output': output[:500] + ('...' if len(output) > 500 else ''),
+                    'script': retriever_path
+                }
+            )
+
+    def evaluate():
+        # Autocomplete queries of indexed scripts are answered from their full candidate list
+        query = (env_vars or {}).get("SEARCH_QUERY")
+        if query is not None and options.get("autocomplete_index"):
             try:
-                return json.loads(result.stdout)
-            except json.JSONDecodeError as e:
-                raise APIError(
-                    f"The {script_type.lower()} script did not return valid JSON",
-                    status_code=400,
-                    details={
-                        'error': str(e),
-                        'output': result.stdout[:500] + ('...' if len(result.stdout) > 500 else ''),
-                        'script': retriever_path
-                    }
+                results = search_index(
+                    retriever_path, str(query), env_vars, additional_args,
+                    lambda: parse(run(dict(execution_env, SEARCH_QUERY=""))),
+                    options.get("cache_ttl"), options.get("autocomplete_limit")
                 )
+            except ValueError as e:
+                raise APIError(str(e), status_code=400, details={'script': retriever_path})
+            return results if parse_json else json.dumps(results)
+
+        # Elements with a retrieverCacheTTL in their schema are served from the cache
+        output = retriever_cache.get(retriever_path, env_vars, additional_args, run,
+                                     options.get("cache_ttl"), options.get("cache_stale"))
+
+        if parse_json:
+            return parse(output)
         else:
-            return result.stdout
-            
-    except subprocess.CalledProcessError as e:
+            return output
+
+    try:
+        return evaluate()
+    except RetrieverCancelled as e:
         raise APIError(
-            f"Failed to execute {script_type.lower()} script",
-            status_code=500,
-            details={
-                'error': str(e),
-                'stderr': e.stderr,
-                'script': retriever_path,
-                'cmd': cmd
-            }
+            f"The {script_type.lower()} script was superseded by a newer request",
+            status_code=409,
+            details={'error': str(e), 'script': retriever_path, 'superseded': True}
         )
+    finally:
+        if token is not None:
+            request_keys.finish(request_key, token)
+
+
+def build_retriever_env(env_vars):
+    """
+    Variables a retriever gets on top of the server's own environment.
+    JSON-encoded values in env_vars are decoded in place.
+    """
+    execution_env = {"DRONA_RUNTIME_DIR": get_runtime_dir()}
+
+    if env_vars:
+        for key, value in env_vars.items():
+            try:
+                parsed = json.loads(value)
+                env_vars[key] = parsed.get('value', parsed) if isinstance(parsed, dict) else str(parsed)
+            except:
+                pass
+        execution_env.update(env_vars)
+
+    return execution_env
+
+
+def resolve_retriever_path(retriever_path, env_dir=None, script_type="Generic"):
+    """Path of a retriever script, relative to env_dir or else the runtime's retriever_scripts"""
+    final_retriever_path = retriever_path
+    if not os.path.isabs(retriever_path) and env_dir:
+        final_retriever_path = os.path.join(env_dir, retriever_path)
+
+    if not os.path.exists(final_retriever_path):
+        fallback_path = os.path.join(get_runtime_dir(), "retriever_scripts", retriever_path)
+        if os.path.exists(fallback_path):
+            final_retriever_path = fallback_path
+        else:
+            raise APIError(
+                f"{script_type} script not found in any of the searched paths",
+                status_code=404,
+                details={"path 1": final_retriever_path, "path 2": fallback_path}
+            )
+
+    return final_retriever_path
 
 def convert_jsonref_to_dict(obj):
     """
@@ -158,32 +272,46 @@ def convert_jsonref_to_dict(obj):
         # It's a primitive value
         return obj
 
-@handle_api_error
-def get_schema_route(environment):
-    """Get schema.json for a specific environment"""
-    env_dir = request.args.get("src")
-    
-    if not env_dir:
-        eres = get_envs_dir()
-        if not eres["ok"]:
-            return jsonify({"message": eres["reason"]}), 400
-        env_dir = eres["path"]
-    
-    base_path = os.path.join(env_dir, environment)
-
-    schema_path = os.path.join(base_path, "schema.json")
-    if os.path.exists(schema_path):
-        schema_data = open(schema_path, 'r').read()
-    else:
-        raise APIError(f"Schema file not found: {schema_path}", status_code=404)
+def element_retriever_options(element):
+    """
+    Options an element's retriever calls carry, from its retrieverCacheTTL,
+    retrieverCacheStale, autocompleteIndex and autocompleteLimit; the
+    client sends them back with every call
+    """
+    options = {}
+    for option, field in (("cache_ttl", "retrieverCacheTTL"), ("cache_stale", "retrieverCacheStale")):
+        if element.get(field) is not None:
+            options[option] = element[field]
+    if element.get("autocompleteIndex"):
+        options["autocomplete_index"] = 1
+        if element.get("autocompleteLimit") is not None:
+            options["autocomplete_limit"] = element["autocompleteLimit"]
+    return options
+
+def retriever_options(source):
+    """Retriever options of a request, from its query arguments or a batched call"""
+    options = {}
+    for option, kind in (("cache_ttl", float), ("cache_stale", float),
+                         ("autocomplete_index", int), ("autocomplete_limit", int)):
+        try:
+            if source.get(option) is not None:
+                options[option] = kind(source.get(option))
+        except (TypeError, ValueError):
+            pass  # Malformed options: the script simply runs uncached and unindexed
+    return options
+
+def resolve_schema(schema_path, loader=None):
+    """Resolve the $refs of a schema.json and return the schema as served, encoded as UTF-8 JSON"""
+    with open(schema_path, 'r') as f:
+        schema_data = f.read()
 
     try:
-        abs_path = os.path.abspath(base_path)
+        abs_path = os.path.dirname(os.path.abspath(schema_path))
         base_uri = f'file:///{abs_path.lstrip("/").replace(os.sep, "/")}/'
-        jsonref_result = jsonref.loads(schema_data, base_uri=base_uri, proxies=True)
-        
+        jsonref_result = jsonref.loads(schema_data, base_uri=base_uri, loader=loader or jsonref.jsonloader, proxies=True)
+
         schema_dict = convert_jsonref_to_dict(jsonref_result)
-        
+
     except json.JSONDecodeError as e:
         raise APIError("Invalid schema JSON", status_code=400, details={'error': str(e)})
 
@@ -192,15 +320,153 @@ def get_schema_route(environment):
             # This whole iteration is unnecessary please refactor this sometime
             retriever_path = element["retriever"]
             element["retrieverPath"] = retriever_path
+            options = element_retriever_options(element)
+            if options:
+                element["retrieverOptions"] = options
             #if not os.path.isabs(retriever_path):
             #    retriever_path = os.path.join(env_dir, environment, retriever_path)
 
+            if element.get("type") in BATCHED_RETRIEVER_TYPES:
+                element.setdefault("retrieverBatch", True)
+
         # Most likely unnecessary, please check
         if element["type"] == "dynamicSelect":
             element["isEvaluated"] = False
             element["isShown"] = False
 
-    return jsonref.dumps(schema_dict)
+    prefetchable = [
+        (path, element["retriever"], element.get("retrieverParams") or {}, element_retriever_options(element))
+        for path, element in iterate_schema_paths(schema_dict)
+        if "retriever" in element and is_prefetchable(element)
+    ]
+    return jsonref.dumps(schema_dict).encode(), prefetchable
+
+schema_cache = SchemaCache(resolve_schema, SCHEMA_CACHE_SIZE)
+
+class PrefetchSlot:
+    """
+    A retriever_slots slot for one prefetch, given back as soon as the
+    /schema request stops waiting for it, so a slow prefetch finishing in
+    the background does not hold a slot that /evaluate_scripts needs.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = False
+        self._detached = False
+
+    def __enter__(self):
+        retriever_slots.acquire()
+        with self._lock:
+            if self._detached:
+                retriever_slots.release()
+            else:
+                self._held = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def release(self):
+        with self._lock:
+            if self._held:
+                self._held = False
+                retriever_slots.release()
+
+    def detach(self):
+        with self._lock:
+            self._detached = True
+        self.release()
+
+def prefetch_retrievers(prefetchable, env_path, environment, budget):
+    """
+    Outputs of field-independent retrievers, run with the environment
+    variables the client would send, as {path: output}. Outputs of elements
+    with a retrieverCacheTTL are kept in prefetch_results for that long and
+    served from there. Other retrievers are started, or joined if a run is
+    already going, and waited for up to budget seconds. Runs still going
+    after that give up their retriever slot and finish in the background,
+    and are not started again for SLOW_RETRIEVER_BACKOFF seconds.
+    """
+    def run(retriever_path, params, options, slot):
+        env_vars = {"DRONA_ENV_DIR": env_path, "DRONA_ENV_NAME": environment}
+        env_vars.update({key: json.dumps(value) for key, value in params.items()})
+        with slot:
+            return execute_script(retriever_path=retriever_path, env_vars=env_vars, script_type="Dynamic Script",
+                                  options=retriever_options(options))
+
+    now = time.monotonic()
+    results = {}
+    pending = {}
+    slots = {}
+    for path, retriever_path, params, options in prefetchable:
+        key = (env_path, retriever_path, json.dumps(params, sort_keys=True), json.dumps(options, sort_keys=True))
+        output = prefetch_results.get(key)
+        if output is not None:
+            results[path] = output
+            continue
+        with slow_retrievers_lock:
+            if slow_retrievers.get((env_path, retriever_path), 0) > now:
+                continue
+        slot = PrefetchSlot()
+        future, new = prefetch_results.start(
+            key, retriever_options(options).get("cache_ttl"),
+            lambda: prefetch_executor.submit(run, retriever_path, params, options, slot)
+        )
+        pending[future] = (path, retriever_path)
+        if new:
+            slots[future] = slot
+
+    if pending:
+        wait(pending, timeout=budget)
+    with slow_retrievers_lock:
+        for future, (path, retriever_path) in pending.items():
+            if future.done():
+                if future.exception() is None:
+                    results[path] = future.result()
+            elif future in slots:
+                slots[future].detach()
+                slow_retrievers[(env_path, retriever_path)] = now + SLOW_RETRIEVER_BACKOFF
+    return results
+
+@handle_api_error
+def get_schema_route(environment):
+    """Get schema.json for a specific environment"""
+    env_dir = request.args.get("src")
+    
+    if not env_dir:
+        eres = get_envs_dir()
+        if not eres["ok"]:
+            return jsonify({"message": eres["reason"]}), 400
+        env_dir = eres["path"]
+    
+    base_path = os.path.join(env_dir, environment)
+
+    schema_path = os.path.join(base_path, "schema.json")
+    if not os.path.exists(schema_path):
+        raise APIError(f"Schema file not found: {schema_path}", status_code=404)
+
+    signature, (data, prefetchable) = schema_cache.entry(schema_path)
+    if not (prefetchable and SCHEMA_PREFETCH_BUDGET > 0):
+        # The schema only changes with its files, so revalidating it costs one stat per file
+        if signature is None:
+            return cached_response(data, "application/json", content_etag(data))
+        etag, last_modified = signature_validators(signature)
+        return cached_response(data, "application/json", etag, last_modified)
+
+    # The client passes DRONA_ENV_DIR as src/env, so prefetched calls use the same
+    results = prefetch_retrievers(prefetchable, f"{env_dir}/{environment}", environment, SCHEMA_PREFETCH_BUDGET)
+    if results:
+        schema_dict = json.loads(data)
+        for path, output in results.items():
+            element = schema_dict
+            for key in path:
+                element = element[key]
+            element["retrieverPrefetchResult"] = {"output": output}
+        data = json.dumps(schema_dict).encode()
+
+    # Prefetched outputs change as they expire, so only an identical body is not modified
+    return cached_response(data, "application/json", content_etag(data))
 
 def get_map_route(environment):
     """Get map.json for a specific environment"""
@@ -217,12 +483,10 @@ def get_map_route(environment):
         env_dir = eres["path"]
     map_path = os.path.join(env_dir, environment, 'map.json')
 
-    if os.path.exists(map_path):
-        map_data = open(map_path, 'r').read()
-    else:
+    if not os.path.exists(map_path):
         raise FileNotFoundError(f"{os.path.join(env_dir, environment, 'map.json')} not found")
-    
-    return map_data
+
+    return file_response(map_path, "text/html")
 
 @handle_api_error
 def evaluate_dynamic_select_route():
@@ -232,7 +496,9 @@ def evaluate_dynamic_select_route():
     result = execute_script(
         retriever_path=retriever_path,
         script_type="Dynamic Select",
-        parse_json=False 
+        parse_json=False,
+        request_key=request.args.get("request_key"),
+        options=retriever_options(request.args)
     )
     
     return result
@@ -253,7 +519,9 @@ def evaluate_autocomplete_route():
         retriever_path=retriever_path,
         env_vars=env_vars,
         script_type="Autocomplete",
-        parse_json=True  #
+        parse_json=True,
+        request_key=request.args.get("request_key"),
+        options=retriever_options(request.args)
     )
     
     return jsonify(result)
@@ -266,7 +534,7 @@ def evaluate_dynamic_text_route():
     # Get all request args except retriever_path as env vars
     env_vars = {
         k.upper(): v for k, v in request.args.items() 
-        if k != "retriever_path"
+        if k not in RETRIEVER_REQUEST_ARGS
     }
     
     # Execute the script with better error handling
@@ -274,7 +542,9 @@ def evaluate_dynamic_text_route():
         retriever_path=retriever_path,
         env_vars=env_vars,
         script_type="Dynamic Text",
-        parse_json=False
+        parse_json=False,
+        request_key=request.args.get("request_key"),
+        options=retriever_options(request.args)
     )
     
     return result
@@ -282,6 +552,75 @@ def evaluate_dynamic_text_route():
 
 
 
+@handle_api_error
+def evaluate_dynamic_text_stream_route():
+    """
+    Stream a dynamic text script's stdout while it runs, as newline-delimited
+    JSON: {"output": text} events, then {"done": true} or one
+    {"error", "message", "status_code", "details"} event. Output beyond
+    DRONA_RETRIEVER_STREAM_MAX_BYTES stops the script.
+    """
+    retriever_path = request.args.get("retriever_path")
+    if not retriever_path:
+        raise APIError("Dynamic Text script path is required", status_code=400)
+
+    # Keys keep their case, as in /evaluate_script which StaticText called before
+    env_vars = {
+        k: v for k, v in request.args.items()
+        if k not in RETRIEVER_REQUEST_ARGS
+    }
+    retriever_path = resolve_retriever_path(retriever_path, env_vars.get("DRONA_ENV_DIR"), "Dynamic Text")
+    execution_env = build_retriever_env(env_vars)
+    cmd = f"bash {os.path.basename(retriever_path)}"
+    request_key = request.args.get("request_key")
+
+    def generate():
+        token = request_keys.start(request_key) if request_key else None
+        cancel = threading.Event()
+        if token is not None:
+            token.on_cancel(cancel.set)
+        stream = RetrieverStream(retriever_path, env=execution_env, cancel=cancel)
+        try:
+            try:
+                for text in stream:
+                    yield json.dumps({"output": text}) + "\n"
+            except RetrieverTimeout as e:
+                raise APIError("The dynamic text script timed out", status_code=504,
+                               details={'error': str(e), 'script': retriever_path, 'cmd': cmd})
+            except RetrieverCancelled as e:
+                raise APIError("The dynamic text script was superseded by a newer request", status_code=409,
+                               details={'error': str(e), 'script': retriever_path, 'superseded': True})
+            except RetrieverOutputLimit as e:
+                raise APIError("The dynamic text script produced too much output", status_code=413,
+                               details={'error': str(e), 'script': retriever_path, 'cmd': cmd})
+            except OSError as e:
+                raise APIError("Failed to execute dynamic text script", status_code=500,
+                               details={'error': str(e), 'script': retriever_path, 'cmd': cmd})
+
+            if stream.returncode != 0:
+                raise APIError(
+                    "Failed to execute dynamic text script",
+                    status_code=500,
+                    details={
+                        'error': f"Command '{cmd}' returned non-zero exit status {stream.returncode}.",
+                        'stderr': stream.stderr,
+                        'script': retriever_path,
+                        'cmd': cmd
+                    }
+                )
+            yield json.dumps({"done": True}) + "\n"
+        except APIError as e:
+            yield json.dumps({"error": True, "message": str(e), "status_code": e.status_code, "details": e.details}) + "\n"
+        finally:
+            if token is not None:
+                request_keys.finish(request_key, token)
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # Keep proxies in front of the dashboard from holding the stream back
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 @handle_api_error
 def evaluate_script_route():
     retriever_path = request.args.get("retriever_path")
@@ -292,14 +631,16 @@ def evaluate_script_route():
     env_vars = {
         k: v
         for k, v in request.args.items()
-        if k not in ["retriever_path"]
+        if k not in RETRIEVER_REQUEST_ARGS
     }
 
     result = execute_script(
         retriever_path=retriever_path,
         env_vars=env_vars if env_vars else None,
         script_type="Dynamic Script",
-        parse_json=False
+        parse_json=False,
+        request_key=request.args.get("request_key"),
+        options=retriever_options(request.args)
     )
 
     return result
@@ -307,6 +648,54 @@ def evaluate_script_route():
 
 
 
+def evaluate_batched_script(call):
+    """Run one call of an /evaluate_scripts request, returning its result event"""
+    try:
+        retriever_path = call.get("retriever_path")
+        if not retriever_path:
+            raise APIError("retriever_path is required", status_code=400)
+        env_vars = {k: v if isinstance(v, str) else json.dumps(v) for k, v in (call.get("params") or {}).items()}
+        with retriever_slots:
+            result = execute_script(
+                retriever_path=retriever_path,
+                env_vars=env_vars if env_vars else None,
+                script_type="Dynamic Script",
+                parse_json=False,
+                request_key=call.get("request_key"),
+                options=retriever_options(call)
+            )
+        return {"id": call.get("id"), "result": result}
+    except APIError as e:
+        return {"id": call.get("id"), "error": True, "message": str(e), "status_code": e.status_code, "details": e.details}
+    except Exception as e:
+        return {"id": call.get("id"), "error": True, "message": str(e), "status_code": 500, "details": {}}
+
+@handle_api_error
+def evaluate_scripts_route():
+    """
+    Run several retriever scripts in one request. The body is
+    {"calls": [{"id": ..., "retriever_path": ..., "params": {...}, "request_key": ..., "cache_ttl": ...}]}
+    with params as evaluate_script takes them as query arguments. Results stream
+    back as newline-delimited JSON in completion order, one
+    {"id", "result"} or {"id", "error", "message", ...} per call.
+    """
+    body = request.get_json(silent=True) or {}
+    calls = body.get("calls")
+    if not isinstance(calls, list):
+        raise APIError("calls must be a list", status_code=400)
+    if len(calls) > RETRIEVER_BATCH_MAX:
+        raise APIError(f"Batch of {len(calls)} retrievers exceeds the limit of {RETRIEVER_BATCH_MAX}", status_code=400)
+
+    def generate():
+        if not calls:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(calls), RETRIEVER_CONCURRENCY)) as executor:
+            futures = [executor.submit(evaluate_batched_script, call) for call in calls]
+            for future in as_completed(futures):
+                yield json.dumps(future.result(), default=str) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @handle_api_error
 def read_file_route():
     """Read a .js file from the environment directory and return its text content"""
@@ -327,10 +716,7 @@ def read_file_route():
     if not os.path.exists(final_path):
         raise APIError(f"File not found: {file_path}", status_code=404)
 
-    with open(final_path, 'r') as f:
-        content = f.read()
-
-    return content, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return file_response(final_path, "text/plain")
 
 
 def register_schema_routes(blueprint):
@@ -340,5 +726,7 @@ def register_schema_routes(blueprint):
     blueprint.route('/evaluate_dynamic_select', methods=['GET'])(evaluate_dynamic_select_route)
     blueprint.route('/evaluate_autocomplete', methods=['GET'])(evaluate_autocomplete_route)
     blueprint.route('/evaluate_dynamic_text', methods=['GET'])(evaluate_dynamic_text_route)
+    blueprint.route('/evaluate_dynamic_text_stream', methods=['GET'])(evaluate_dynamic_text_stream_route)
     blueprint.route('/evaluate_script', methods=['GET'])(evaluate_script_route)
+    blueprint.route('/evaluate_scripts', methods=['POST'])(evaluate_scripts_route)
     blueprint.route('/read_file', methods=['GET'])(read_file_route)